@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+
+
+def random_sequences(rng, count, length):
+    """
+    Return count random nucleotide sequences of the given length.
+    """
+    codes = BASES[rng.integers(0, 4, size=(count, length))]
+    return [row.tobytes().decode("ascii") for row in codes]
+
+
+def generate_filters(n_filters=50, filter_length=8, seed=0):
+    """
+    Generate a filters table of n_filters distinct random sequences of filter_length bases.
+    """
+    rng = np.random.default_rng(seed)
+    sequences = []
+    seen = set()
+    while len(sequences) < n_filters:
+        for sequence in random_sequences(rng, n_filters, filter_length):
+            if sequence not in seen and len(sequences) < n_filters:
+                seen.add(sequence)
+                sequences.append(sequence)
+    return pd.DataFrame({
+        "ID": [f"F{index}" for index in range(1, n_filters + 1)],
+        "Name": [f"filter_{index}" for index in range(1, n_filters + 1)],
+        "Filter Sequence": sequences,
+        "Mutation Codon": random_sequences(rng, n_filters, 3),
+    })
+
+
+def generate_cocktail(filters, n_reads=100000, read_length=60, duplication_rate=0.5, multi_hit_density=0.1,
+                      single_hit_density=0.5, seed=0):
+    """
+    Generate a cocktail table of n_reads reads of read_length bases.
+
+    A fraction duplication_rate of the reads repeats an earlier sequence. Among the distinct sequences,
+    multi_hit_density carry two or three filter sequences and single_hit_density carry exactly one; the
+    others are random (and may still hit short filters by chance).
+    """
+    rng = np.random.default_rng(seed)
+    filter_sequences = filters["Filter Sequence"].tolist()
+    n_distinct = max(1, int(round(n_reads * (1 - duplication_rate))))
+
+    sequences = random_sequences(rng, n_distinct, read_length)
+    hits = rng.random(n_distinct)
+    for index in range(n_distinct):
+        if hits[index] < multi_hit_density:
+            n_inserts = int(rng.integers(2, 4))
+        elif hits[index] < multi_hit_density + single_hit_density:
+            n_inserts = 1
+        else:
+            continue
+        sequence = sequences[index]
+        for filter_seq in rng.choice(filter_sequences, size=n_inserts).tolist():
+            if len(filter_seq) <= len(sequence):
+                start = int(rng.integers(0, len(sequence) - len(filter_seq) + 1))
+                sequence = sequence[:start] + filter_seq + sequence[start + len(filter_seq):]
+        sequences[index] = sequence
+
+    # Every distinct sequence appears at least once, the remaining reads repeat random ones
+    picks = np.concatenate([np.arange(n_distinct), rng.integers(0, n_distinct, size=n_reads - n_distinct)])
+    rng.shuffle(picks)
+    return pd.DataFrame({
+        "Sequence": [sequences[pick] for pick in picks.tolist()],
+        "Count": rng.integers(1, 100, size=n_reads),
+        "Amino Acid": "X",
+    })
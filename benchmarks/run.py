@@ -0,0 +1,185 @@
+"""
+Benchmark the stages of GeneCocktailAnalyser on seeded synthetic datasets over a parameter grid.
+
+Run from the repository root:
+
+    python -m benchmarks.run --grid quick --output benchmarks/baselines/quick.json
+    python -m benchmarks.run --grid quick --compare benchmarks/baselines/quick.json
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+
+matplotlib.use("Agg")  # Plots are rendered off-screen, plt.show() does nothing
+
+import matplotlib.pyplot as plt
+
+from benchmarks.generators import generate_cocktail, generate_filters
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+STAGES = ("load", "process_data", "display_results", "plot_heatmap")
+
+GRIDS = {
+    "quick": {
+        "n_reads": [20000],
+        "read_length": [60],
+        "duplication_rate": [0.5],
+        "n_filters": [50],
+        "filter_length": [8],
+        "multi_hit_density": [0.1],
+    },
+    "default": {
+        "n_reads": [100000, 1000000],
+        "read_length": [60, 150],
+        "duplication_rate": [0.0, 0.8],
+        "n_filters": [50, 500],
+        "filter_length": [8],
+        "multi_hit_density": [0.01, 0.2],
+    },
+}
+
+
+def grid_points(grid):
+    """
+    Yield every combination of the grid parameters as a dict.
+    """
+    names = sorted(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def write_dataset(params, directory, seed):
+    """
+    Generate the cocktail and filters CSV files of a grid point, return their paths.
+    """
+    filters = generate_filters(params["n_filters"], params["filter_length"], seed=seed)
+    cocktail = generate_cocktail(filters, params["n_reads"], params["read_length"], params["duplication_rate"],
+                                 params["multi_hit_density"], seed=seed)
+    cocktail_file = os.path.join(directory, "bench_cocktail.csv")
+    filters_file = os.path.join(directory, "bench_filters.csv")
+    cocktail.to_csv(cocktail_file, index=False)
+    filters.to_csv(filters_file, index=False)
+    return cocktail_file, filters_file
+
+
+def run_stages(cocktail_file, filters_file, process_options, trace_memory=False):
+    """
+    Run the stages once on a fresh analyser, return {stage: (seconds, peak traced bytes or None)}.
+    """
+    analyser = None
+    measurements = {}
+    for stage in STAGES:
+        if trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if stage == "load":
+                analyser = GeneCocktailAnalyser(cocktail_file, filters_file)
+            elif stage == "process_data":
+                analyser.process_data(**process_options)
+            else:
+                getattr(analyser, stage)()
+        seconds = time.perf_counter() - start
+        measurements[stage] = (seconds, tracemalloc.get_traced_memory()[1] if trace_memory else None)
+        plt.close("all")
+    return measurements
+
+
+def run_benchmarks(grid, repeats=3, seed=0, process_options=None):
+    """
+    Benchmark every grid point: the best time over repeats runs, and the peak memory of an extra traced run
+    (tracing slows allocations down, so it is not timed). Return a list of result records.
+    """
+    process_options = process_options or {}
+    records = []
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="gca_bench_") as directory:
+        os.chdir(directory)  # Reports and figures are written under results/ of the temporary directory
+        try:
+            for params in grid_points(grid):
+                cocktail_file, filters_file = write_dataset(params, directory, seed)
+                timings = [run_stages(cocktail_file, filters_file, process_options) for _ in range(repeats)]
+                tracemalloc.start()
+                try:
+                    memory = run_stages(cocktail_file, filters_file, process_options, trace_memory=True)
+                finally:
+                    tracemalloc.stop()
+
+                for stage in STAGES:
+                    seconds = min(timing[stage][0] for timing in timings)
+                    records.append({
+                        "params": params,
+                        "stage": stage,
+                        "seconds": seconds,
+                        "reads_per_sec": params["n_reads"] / seconds if seconds > 0 else None,
+                        "peak_bytes": memory[stage][1],
+                    })
+                    print(f"{stage:>16} {json.dumps(params, sort_keys=True)}: {seconds:.3f}s, "
+                          f"{records[-1]['reads_per_sec']:,.0f} reads/s, {memory[stage][1] / 2 ** 20:.1f} MiB peak")
+        finally:
+            os.chdir(working_directory)
+    return records
+
+
+def record_key(record):
+    return record["stage"], json.dumps(record["params"], sort_keys=True)
+
+
+def compare(records, baseline, tolerance):
+    """
+    Print the speed of every record relative to the baseline, return the number of regressions slower than the
+    baseline by more than the tolerance (a fraction).
+    """
+    baseline_records = {record_key(record): record for record in baseline["results"]}
+    regressions = 0
+    for record in records:
+        reference = baseline_records.get(record_key(record))
+        if reference is None:
+            continue
+        ratio = record["seconds"] / reference["seconds"]
+        regressed = ratio > 1 + tolerance
+        regressions += regressed
+        print(f"{record['stage']:>16} {record_key(record)[1]}: {ratio:.2f}x baseline time"
+              + (" REGRESSION" if regressed else ""))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark GeneCocktailAnalyser on synthetic datasets.")
+    parser.add_argument("--grid", choices=sorted(GRIDS), default="quick")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", default="automaton")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="Save the results as a JSON baseline")
+    parser.add_argument("--compare", help="Compare against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    records = run_benchmarks(GRIDS[args.grid], args.repeats, args.seed,
+                             {"engine": args.engine, "workers": args.workers})
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"grid": args.grid, "seed": args.seed, "engine": args.engine, "workers": args.workers,
+                       "python": platform.python_version(), "platform": platform.platform(), "results": records},
+                      f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 1 if compare(records, baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
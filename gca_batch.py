@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+from gene_cocktail_analyser import GeneCocktailAnalyser
+import io
+import os
+import pandas as pd
+import warnings
+
+# Filter set shared by the datasets of a batch, set once per worker process by the pool initializer
+_batch_context = None
+
+
+def _init_batch(context):
+    global _batch_context
+    _batch_context = context
+
+
+def _analyse_dataset(cocktail_file):
+    """
+    Analyse one cocktail file against the prepared and compiled filter set, write its consolidated report and return
+    (dataset name, filter matches).
+    """
+    filters, filter_index, template, analyser_options, process_options = _batch_context
+    analyser = GeneCocktailAnalyser(cocktail_file, filters, filter_index=filter_index, **analyser_options)
+    analyser.process_data(template=template, **process_options)
+    with contextlib.redirect_stdout(io.StringIO()):  # Reports are written to results/, not printed
+        analyser.display_results()
+    return analyser.dataset_name, analyser.results["filter_matches"]
+
+
+def run_batch(cocktail_files, filters_file, workers=None, matrix_filename="results/batch_filter_counts.csv",
+              cocktail_columns=None, filters_columns=None, chunksize=None, read_options=None, count_multiple_hits=True,
+              overlapping=False, weight_by="rows", engine="automaton", max_mismatches=0, strand="forward"):
+    """
+    Analyse many cocktail files against one filter set. The filters are loaded, validated and compiled once, then
+    the files are processed concurrently by a pool of worker processes (os.cpu_count() by default), each writing
+    the consolidated report of its dataset under results/.
+
+    Returns the cross-sample matrix of filter matches (filters x datasets), also saved to matrix_filename.
+    The other options are those of GeneCocktailAnalyser and its process_data method.
+    """
+    cocktail_files = list(cocktail_files)
+    if not cocktail_files:
+        raise ValueError("No cocktail files to analyse.")
+    analyser_options = {"cocktail_columns": cocktail_columns, "filters_columns": filters_columns,
+                        "chunksize": chunksize, "read_options": read_options}
+
+    # The first dataset compiles the filter set, with a chunksize only its header is read
+    reference = GeneCocktailAnalyser(cocktail_files[0], filters_file,
+                                     **dict(analyser_options, chunksize=chunksize or 1))
+    reference.prepare_filters()
+    template = reference.build_accumulator(overlapping, engine, False, max_mismatches, strand)
+    process_options = {"count_multiple_hits": count_multiple_hits, "weight_by": weight_by}
+    context = (reference.filters, reference.filter_index, template, analyser_options, process_options)
+
+    workers = min(workers or os.cpu_count() or 1, len(cocktail_files))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch, initargs=(context,)) as executor:
+            datasets = list(executor.map(_analyse_dataset, cocktail_files))
+    else:
+        _init_batch(context)
+        datasets = [_analyse_dataset(cocktail_file) for cocktail_file in cocktail_files]
+
+    names = [name for name, _ in datasets]
+    if len(set(names)) < len(names):
+        warnings.warn("Several cocktail files share a dataset name, their reports overwrite each other.")
+
+    matrix = pd.concat([pd.Series(filter_matches, name=name) for name, filter_matches in datasets], axis=1)
+    matrix = matrix.reindex(template.filter_ids)
+    matrix.index.name = reference.filters_columns[0]
+    os.makedirs(os.path.dirname(matrix_filename) or ".", exist_ok=True)
+    matrix.to_csv(matrix_filename)
+    return matrix
@@ -0,0 +1,128 @@
+from gca_multihits import pickled_segments
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+CACHE_VERSION = 3  # Bump when the layout of the cached results changes
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_digest(source):
+    """
+    Return the hex digest of the content of a file, given its path or an in-memory buffer (BytesIO, StringIO,
+    uploads), or of a loaded DataFrame.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    if hasattr(source, "to_csv"):
+        digest.update(source.to_csv(index=False).encode("utf-8"))
+        return digest.hexdigest()
+    if hasattr(source, "getbuffer"):
+        digest.update(source.getbuffer())
+        return digest.hexdigest()
+    if hasattr(source, "read"):
+        # Other buffers (e.g. StringIO) are hashed from the start and left at the start for reading
+        source.seek(0)
+        for block in iter(lambda: source.read(HASH_BLOCK_SIZE), type(source.read(0))()):
+            digest.update(block.encode("utf-8") if isinstance(block, str) else block)
+        source.seek(0)
+        return digest.hexdigest()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent on-disk cache of analysis results, keyed by the content of the inputs and the analysis options.
+    Entries are pickled into one file each, with the spilled segments of their multi-hit stores in a directory
+    next to it; the least recently used entries are evicted once the cache grows beyond max_bytes.
+    """
+
+    def __init__(self, directory=".gca_cache", max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, *parts):
+        """
+        Build a cache key from JSON-serializable parts (content digests, column names, options).
+        """
+        payload = json.dumps([CACHE_VERSION, *parts], sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    @staticmethod
+    def _segments_path(path):
+        return os.path.splitext(path)[0] + ".segments"
+
+    def _remove(self, path):
+        os.remove(path)
+        shutil.rmtree(self._segments_path(path), ignore_errors=True)
+
+    def get(self, key):
+        """
+        Return the cached value for the key, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)  # Mark as recently used
+        return value
+
+    def put(self, key, value):
+        """
+        Store a value under the key, then evict least recently used entries beyond max_bytes.
+        """
+        # Write to a temporary file first so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f, pickled_segments(self._segments_path(self._path(key))):
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self._path(key))
+        self.evict()
+
+    def entries(self):
+        """
+        Return (path, size, last use time) of the cache entries, least recently used first. The size includes the
+        spilled segments of the entry.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                size = stat.st_size
+                segments_path = self._segments_path(path)
+                if os.path.isdir(segments_path):
+                    size += sum(entry.stat().st_size for entry in os.scandir(segments_path))
+                entries.append((path, size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def invalidate(self, key=None):
+        """
+        Remove the entry for the key, or every entry when no key is given.
+        """
+        paths = [self._path(key)] if key is not None else [path for path, _, _ in self.entries()]
+        for path in paths:
+            if os.path.exists(path):
+                self._remove(path)
@@ -0,0 +1,74 @@
+import argparse
+import json
+import sys
+
+from gca_report import REPORT_FORMATS
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Analyse gene cocktail files against a filters file without loading the plotting stack.")
+    parser.add_argument("cocktail_files", nargs="+", help="Cocktail CSV, FASTQ or FASTA files")
+    parser.add_argument("--filters", required=True, help="Filters CSV file")
+    parser.add_argument("--chunksize", type=int, help="Stream the cocktail files in chunks of that many rows")
+    parser.add_argument("--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--engine", choices=("automaton", "kmer"), default="automaton")
+    parser.add_argument("--strand", choices=("forward", "both"), default="forward")
+    parser.add_argument("--max-mismatches", type=int, default=0)
+    parser.add_argument("--weight-by", choices=("rows", "count"), default="rows")
+    parser.add_argument("--overlapping", action="store_true", help="Count overlapping occurrences")
+    parser.add_argument("--cache", help="Directory of a result cache reused across runs")
+    parser.add_argument("--output", help="Write the results as JSON to this file instead of stdout")
+    parser.add_argument("--report", action="store_true",
+                        help="Also write the consolidated report under results/ (always done for several files)")
+    parser.add_argument("--report-format", choices=("txt",) + REPORT_FORMATS, default="txt",
+                        help="Format of the report of a single file, txt being the consolidated text report")
+    parser.add_argument("--matrix", default="results/batch_filter_counts.csv",
+                        help="Cross-sample filter count matrix written for several cocktail files")
+    return parser
+
+
+def analyse(args):
+    """
+    Analyse a single cocktail file, return its results.
+    """
+    cache = None
+    if args.cache:
+        from gca_cache import ResultCache
+        cache = ResultCache(args.cache)
+    analyser = GeneCocktailAnalyser(args.cocktail_files[0], args.filters, chunksize=args.chunksize, cache=cache)
+    analyser.process_data(overlapping=args.overlapping, weight_by=args.weight_by, workers=args.workers,
+                          engine=args.engine, max_mismatches=args.max_mismatches, strand=args.strand)
+    if args.report and args.report_format == "txt":
+        analyser.display_results()
+    elif args.report:
+        analyser.write_report(args.report_format)
+    return {analyser.dataset_name: analyser.results}
+
+
+def analyse_batch(args):
+    """
+    Analyse several cocktail files in batch mode, return their filter counts by dataset.
+    """
+    from gca_batch import run_batch
+    matrix = run_batch(args.cocktail_files, args.filters, workers=args.workers, matrix_filename=args.matrix,
+                       chunksize=args.chunksize, overlapping=args.overlapping, weight_by=args.weight_by,
+                       engine=args.engine, max_mismatches=args.max_mismatches, strand=args.strand)
+    return {dataset: {"filter_matches": counts.to_dict()} for dataset, counts in matrix.items()}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = analyse(args) if len(args.cocktail_files) == 1 else analyse_batch(args)
+    output = json.dumps(results, indent=2, default=int)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+from itertools import combinations
+import numpy as np
+import pandas as pd
+
+# Number of set bits of every byte value
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+class FilterBitsets:
+    """
+    One packed bitset per filter marking the reads that hit it, over a fixed list of reads.
+    """
+
+    def __init__(self, bits, filter_ids):
+        self.bits = bits
+        self.filter_ids = list(filter_ids)
+
+    @classmethod
+    def from_read_filters(cls, read_filters):
+        """
+        Build the bitsets from an iterable of per-read filter ID lists.
+        """
+        read_filters = list(read_filters)
+        filter_ids = sorted({filter_id for filter_ids in read_filters for filter_id in filter_ids})
+        column = {filter_id: position for position, filter_id in enumerate(filter_ids)}
+
+        lengths = np.fromiter((len(filter_ids) for filter_ids in read_filters), dtype=np.int64, count=len(read_filters))
+        columns = np.fromiter((column[filter_id] for filter_ids in read_filters for filter_id in filter_ids),
+                              dtype=np.int64, count=int(lengths.sum()))
+        reads = np.repeat(np.arange(len(read_filters), dtype=np.int64), lengths)
+
+        bits = np.zeros((len(filter_ids), -(-len(read_filters) // 8)), dtype=np.uint8)
+        np.bitwise_or.at(bits, (columns, reads >> 3), (128 >> (reads & 7)).astype(np.uint8))
+        return cls(bits, filter_ids)
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        Build the bitsets of the reads of a MultiHitStore from its (rows, indptr, filter positions) blocks, one
+        block in memory at a time, reads being numbered in row order.
+        """
+        hit_ids = {store.filter_ids[position] for position in np.flatnonzero(store.filter_counts()).tolist()}
+        filter_ids = sorted(hit_ids)
+        column = {filter_id: position for position, filter_id in enumerate(filter_ids)}
+        columns_of_positions = np.array([column.get(filter_id, -1) for filter_id in store.filter_ids], dtype=np.int64)
+
+        bits = np.zeros((len(filter_ids), -(-len(store) // 8)), dtype=np.uint8)
+        first_read = 0
+        for rows, indptr, positions in store.iter_blocks():
+            reads = first_read + np.repeat(np.arange(len(rows), dtype=np.int64), np.diff(indptr))
+            columns = columns_of_positions[np.asarray(positions)]
+            np.bitwise_or.at(bits, (columns, reads >> 3), (128 >> (reads & 7)).astype(np.uint8))
+            first_read += len(rows)
+        return cls(bits, filter_ids)
+
+    @staticmethod
+    def popcount(bits):
+        return int(POPCOUNT[bits].sum(dtype=np.int64))
+
+    def supports(self):
+        """
+        Return the number of reads hit by every filter.
+        """
+        return POPCOUNT[self.bits].sum(axis=1, dtype=np.int64)
+
+    def frequent_combinations(self, min_support=2, min_size=2, max_size=None):
+        """
+        Mine the filter combinations occurring together in at least min_support reads, level by level: a
+        combination of size k is only counted (AND of bitsets, popcount) when all its subsets of size k - 1 are
+        frequent. Return a list of (filter IDs, support) pairs.
+        """
+        supports = self.supports()
+        level = {(position,): self.bits[position] for position in np.flatnonzero(supports >= min_support).tolist()}
+        found = [(combination, int(supports[combination[0]])) for combination in level] if min_size <= 1 else []
+
+        size = 2
+        while level and (max_size is None or size <= max_size):
+            next_level = {}
+            prefixes = {}
+            for combination in sorted(level):
+                prefixes.setdefault(combination[:-1], []).append(combination[-1])
+
+            # Join combinations sharing all but their last filter, prune candidates with an infrequent subset
+            for prefix, lasts in prefixes.items():
+                for first_index, first in enumerate(lasts):
+                    bits = level[prefix + (first,)]
+                    for second in lasts[first_index + 1:]:
+                        candidate = prefix + (first, second)
+                        if any(subset not in level for subset in combinations(candidate, size - 1)):
+                            continue
+                        candidate_bits = bits & self.bits[second]
+                        support = self.popcount(candidate_bits)
+                        if support >= min_support:
+                            next_level[candidate] = candidate_bits
+
+            if size >= min_size:
+                found.extend((combination, self.popcount(bits)) for combination, bits in next_level.items())
+            level = next_level
+            size += 1
+
+        return [(tuple(self.filter_ids[position] for position in combination), support)
+                for combination, support in found]
+
+
+def combinations_frame(found):
+    """
+    Return mined combinations as a DataFrame sorted by size, then decreasing support.
+    """
+    frame = pd.DataFrame({"Filters": [filter_ids for filter_ids, _ in found],
+                          "Size": [len(filter_ids) for filter_ids, _ in found],
+                          "Support": [support for _, support in found]}, columns=["Filters", "Size", "Support"])
+    return frame.sort_values(["Size", "Support"], ascending=[True, False], kind="stable").reset_index(drop=True)
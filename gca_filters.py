@@ -0,0 +1,49 @@
+import pandas as pd
+
+
+class FilterIndex:
+    """
+    Filter metadata in compact arrays ordered like the filters, with an O(1) lookup from filter ID to position.
+    """
+
+    def __init__(self, filters, id_col, name_col, sequence_col, codon_col="Mutation Codon"):
+        self.ids = filters[id_col].to_numpy()
+        self.names = filters[name_col].to_numpy(dtype=object)
+        self.sequences = filters[sequence_col].to_numpy(dtype=object)
+        self.codons = filters[codon_col].to_numpy(dtype=object) if codon_col in filters.columns else None
+
+        # Like a lookup of the first matching row, duplicated IDs resolve to their first position
+        self.positions = {}
+        for position, filter_id in enumerate(self.ids.tolist()):
+            self.positions.setdefault(filter_id, position)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, filter_id):
+        return filter_id in self.positions
+
+    def position(self, filter_id):
+        return self.positions[filter_id]
+
+    def name(self, filter_id):
+        return self.names[self.positions[filter_id]]
+
+    def sequence(self, filter_id):
+        return self.sequences[self.positions[filter_id]]
+
+    def codon(self, filter_id):
+        """
+        Return the mutation codon of the filter, None when the filters have no Mutation Codon column.
+        """
+        return self.codons[self.positions[filter_id]] if self.codons is not None else None
+
+    def description(self, filter_id):
+        """
+        Return the "ID | Name | Mutation Codon" description used in the reports, without the codon when missing.
+        """
+        description = f"{filter_id} | {self.name(filter_id)}"
+        codon = self.codon(filter_id)
+        if codon is not None and pd.notnull(codon):
+            description += f" | {codon}"
+        return description
@@ -0,0 +1,140 @@
+import numpy as np
+
+
+class IncidenceMatrix:
+    """
+    Sparse read x filter incidence matrix in CSR layout: rows are cocktail sequences (non-NaN rows in file order),
+    columns are filter positions (sorted filters) and values are occurrence counts. An optional weights array holds
+    the weight of every row (its read count), rows weigh 1 otherwise.
+    """
+
+    def __init__(self, indptr, indices, data, n_filters, weights=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_filters = n_filters
+        self.weights = weights
+
+    @classmethod
+    def from_hits(cls, n_rows, n_filters, row_indices, filter_positions, occurrences, weights=None):
+        """
+        Build the matrix from flat (row, filter position, occurrences) arrays ordered by row.
+        """
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_indices, minlength=n_rows), out=indptr[1:])
+        return cls(indptr, np.asarray(filter_positions, dtype=np.int32), np.asarray(occurrences, dtype=np.int32),
+                   n_filters, weights)
+
+    @classmethod
+    def vstack(cls, blocks, n_filters):
+        """
+        Stack matrices of consecutive rows into one.
+        """
+        blocks = list(blocks)
+        if not blocks:
+            return cls(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32),
+                       n_filters)
+
+        offsets = np.cumsum([0] + [block.nnz for block in blocks])
+        indptr = np.concatenate([np.zeros(1, dtype=np.int64)]
+                                + [block.indptr[1:] + offset for block, offset in zip(blocks, offsets)])
+        weights = None
+        if any(block.weights is not None for block in blocks):
+            weights = np.concatenate([block.row_weights() for block in blocks])
+        return cls(indptr, np.concatenate([block.indices for block in blocks]),
+                   np.concatenate([block.data for block in blocks]), n_filters, weights)
+
+    @property
+    def n_rows(self):
+        return len(self.indptr) - 1
+
+    @property
+    def shape(self):
+        return self.n_rows, self.n_filters
+
+    @property
+    def nnz(self):
+        return int(self.indptr[-1])
+
+    @property
+    def nbytes(self):
+        weights_nbytes = self.weights.nbytes if self.weights is not None else 0
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes + weights_nbytes
+
+    def row(self, row):
+        """
+        Return the (filter positions, occurrences) of one row.
+        """
+        start, stop = self.indptr[row], self.indptr[row + 1]
+        return self.indices[start:stop], self.data[start:stop]
+
+    def row_weights(self):
+        return self.weights if self.weights is not None else np.ones(self.n_rows, dtype=np.int64)
+
+    def entry_rows(self):
+        """
+        Return the row of every stored entry.
+        """
+        return np.repeat(np.arange(self.n_rows, dtype=np.int64), np.diff(self.indptr))
+
+    def take_rows(self, rows, weights=None):
+        """
+        Return the matrix made of the given rows (repetitions allowed), with optional new row weights.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.indptr[rows]
+        counts = self.indptr[rows + 1] - starts
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        entries = np.repeat(starts - indptr[:-1], counts) + np.arange(indptr[-1], dtype=np.int64)
+        return IncidenceMatrix(indptr, self.indices[entries], self.data[entries], self.n_filters, weights)
+
+    def filter_totals(self, repeated_only=False):
+        """
+        Return the weighted number of occurrences of every filter, optionally only counting rows where the
+        filter occurs more than once.
+        """
+        weighted = self.data.astype(np.int64)
+        if self.weights is not None:
+            weighted *= self.weights[self.entry_rows()]
+        indices = self.indices
+        if repeated_only:
+            repeated = self.data > 1
+            weighted, indices = weighted[repeated], indices[repeated]
+        totals = np.zeros(self.n_filters, dtype=np.int64)
+        np.add.at(totals, indices, weighted)
+        return totals
+
+    def filters_per_row(self):
+        return np.diff(self.indptr)
+
+    def matched_rows(self):
+        """
+        Return a mask of the rows matching at least one filter.
+        """
+        return self.filters_per_row() > 0
+
+    def multi_hit_rows(self):
+        """
+        Return a mask of the rows matching more than one filter, or one filter more than once.
+        """
+        repeated = np.bincount(self.entry_rows()[self.data > 1], minlength=self.n_rows) > 0
+        return (self.filters_per_row() > 1) | repeated
+
+    def cooccurrence(self):
+        """
+        Return the dense filter x filter matrix counting the rows where two filters occur together (Aᵀ·A of the
+        binary matrix, diagonal included).
+        """
+        row_sizes = self.filters_per_row()
+        entry_rows = self.entry_rows()
+
+        # Every entry is paired with every entry of its row
+        pair_counts = row_sizes[entry_rows]
+        left = np.repeat(np.arange(self.nnz, dtype=np.int64), pair_counts)
+        right_offsets = np.repeat(self.indptr[entry_rows] - (np.cumsum(pair_counts) - pair_counts), pair_counts)
+        right = right_offsets + np.arange(len(left), dtype=np.int64)
+
+        linear = self.indices[left].astype(np.int64) * self.n_filters + self.indices[right]
+        counts = np.bincount(linear, minlength=self.n_filters * self.n_filters)
+        return counts.reshape(self.n_filters, self.n_filters)
@@ -0,0 +1,84 @@
+import contextlib
+import functools
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident set size of the process so far, None where it is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Kilobytes on Linux, bytes on macOS
+
+
+class Instrumentation:
+    """
+    Opt-in per-stage metrics: wall time, CPU time, rows processed and, with trace_memory, the peak of Python
+    allocations during the stage (tracemalloc, which slows allocations down). peak_rss_bytes is the peak RSS of the
+    process since it started, as of the end of the stage: it only tells the memory of a stage when the stage raised
+    it, use trace_memory for per-stage peaks.
+
+    Metrics are kept in stages as {stage: metrics dict}, and every hook is called with (stage, metrics) when a
+    stage completes, e.g. to forward them to logging.
+    """
+
+    def __init__(self, hooks=None, trace_memory=False):
+        self.hooks = list(hooks) if hooks else []
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Measure the enclosed code as the given stage, the yielded metrics dict can be completed (e.g. its rows).
+        """
+        metrics = {"rows": None}
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif self.trace_memory:
+            tracemalloc.reset_peak()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield metrics
+            metrics["wall_seconds"] = time.perf_counter() - wall_start
+            metrics["cpu_seconds"] = time.process_time() - cpu_start
+            metrics["peak_rss_bytes"] = peak_rss_bytes()
+            metrics["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        self.stages[name] = metrics
+        for hook in self.hooks:
+            hook(name, metrics)
+
+
+def instrumented(stage, rows=None):
+    """
+    Decorate an analyser method to be measured as a stage when the analyser has an instrumentation.
+    rows, a function of the analyser, gives the rows processed by the stage.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.instrumentation is None:
+                return method(self, *args, **kwargs)
+            with self.instrumentation.stage(stage) as metrics:
+                result = method(self, *args, **kwargs)
+                if rows is not None:
+                    metrics["rows"] = rows(self)
+            return result
+
+        return wrapper
+
+    return decorate
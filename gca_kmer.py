@@ -0,0 +1,322 @@
+import numpy as np
+import pandas as pd
+
+# 2-bit codes of the nucleotides, every other byte is ambiguous
+AMBIGUOUS = 4
+_ENCODE = np.full(256, AMBIGUOUS, dtype=np.uint8)
+for _code, _base in enumerate(b"ACGT"):
+    _ENCODE[_base] = _code
+_DECODE = np.frombuffer(b"ACGTN", dtype=np.uint8)
+
+
+class PackedSequences:
+    """
+    Compact store of sequences: 2 bits per nucleotide in one contiguous byte array, an offsets array delimiting
+    the sequences and, as a side mask, the positions of N or other ambiguous bases.
+    """
+
+    def __init__(self, packed, offsets, ambiguous):
+        self.packed = packed
+        self.offsets = offsets
+        self.ambiguous = ambiguous
+
+    @classmethod
+    def from_sequences(cls, sequences):
+        """
+        Pack an iterable of sequence strings.
+        """
+        sequences = list(sequences)
+        lengths = np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences))
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        # Encode all sequences at once, non-ASCII characters become single '?' bytes so offsets stay valid
+        raw = np.frombuffer("".join(sequences).encode("ascii", errors="replace"), dtype=np.uint8)
+        return cls.from_codes(_ENCODE[raw], offsets)
+
+    @classmethod
+    def from_codes(cls, codes, offsets):
+        """
+        Pack an array of one code per base (AMBIGUOUS for ambiguous bases, overwritten) delimiting sequences by
+        offsets.
+        """
+        ambiguous = np.flatnonzero(codes == AMBIGUOUS)
+        codes[ambiguous] = 0
+
+        # Four bases per byte, the first base in the two most significant bits
+        padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+        padded[:len(codes)] = codes
+        packed = (padded[0::4] << 6) | (padded[1::4] << 4) | (padded[2::4] << 2) | padded[3::4]
+        return cls(packed, offsets, ambiguous)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        """
+        Decode one sequence back to a string, ambiguous bases are returned as N.
+        """
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return _DECODE[self.codes(start, stop)].tobytes().decode("ascii")
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        return self.packed.nbytes + self.offsets.nbytes + self.ambiguous.nbytes
+
+    def take(self, indices):
+        """
+        Return the sequences at the given indices as a new PackedSequences, without unpacking the others.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices]
+        lengths = self.offsets[indices + 1] - starts
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1], dtype=np.int64)
+        codes = ((self.packed[positions >> 2] >> (6 - 2 * (positions & 3))) & 3).astype(np.uint8)
+        codes[np.isin(positions, self.ambiguous)] = AMBIGUOUS
+        return self.from_codes(codes, offsets)
+
+    def slice(self, start, stop):
+        """
+        Return the sequences start to stop (excluded) as a new PackedSequences.
+        """
+        first_base, last_base = self.offsets[start], self.offsets[stop]
+        return self.from_codes(self.codes(first_base, last_base), self.offsets[start:stop + 1] - first_base)
+
+    def codes(self, start=0, stop=None):
+        """
+        Unpack the bases in [start, stop) of the concatenated sequences to one code per byte,
+        with ambiguous bases set to AMBIGUOUS.
+        """
+        stop = self.offsets[-1] if stop is None else stop
+        packed = self.packed[start // 4:-(-stop // 4)]
+        codes = np.empty(len(packed) * 4, dtype=np.uint8)
+        for index in range(4):
+            codes[index::4] = (packed >> (6 - 2 * index)) & 3
+        codes = codes[start % 4:start % 4 + stop - start]
+
+        ambiguous = self.ambiguous[np.searchsorted(self.ambiguous, start):np.searchsorted(self.ambiguous, stop)]
+        codes[ambiguous - start] = AMBIGUOUS
+        return codes
+
+
+class PackedReads:
+    """
+    Compact reads of a cocktail table: the distinct sequences as PackedSequences, and for every row the code of its
+    distinct sequence (-1 for a missing sequence). Sequences take 2 bits per base and duplicates a code per row,
+    instead of a Python string per row.
+    """
+
+    def __init__(self, codes, distinct):
+        self.codes = codes
+        self.distinct = distinct
+
+    @classmethod
+    def from_series(cls, sequences):
+        """
+        Pack a Series of sequence strings, NaNs allowed.
+        """
+        codes, distinct = pd.factorize(sequences)
+        return cls(codes.astype(np.int32), PackedSequences.from_sequences(distinct))
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.distinct.nbytes
+
+    def isna(self):
+        return self.codes < 0
+
+    def take(self, rows):
+        """
+        Return the reads of the given rows as new PackedReads holding only their distinct sequences.
+        """
+        codes = self.codes[rows]
+        present = codes >= 0
+        used, inverse = np.unique(codes[present], return_inverse=True)
+        if len(used) == len(self.distinct):
+            return PackedReads(codes, self.distinct)
+        batch_codes = np.full(len(codes), -1, dtype=np.int32)
+        batch_codes[present] = inverse
+        return PackedReads(batch_codes, self.distinct.take(used))
+
+
+class KmerMatcher:
+    """
+    Vectorized matcher for fixed-length nucleotide filters. Every k-mer of a batch of packed sequences is turned
+    into a 2k-bit rolling hash and looked up in the sorted hashes of the filters of length k, without per-sequence
+    Python calls. Only filters made of A, C, G and T and at most max_length bases long are supported.
+    """
+
+    max_length = 32  # 2 bits per base in a 64-bit hash
+    max_slice_bases = 1 << 21  # Bases matched at a time, bounding the per-base arrays of match
+    presence_bits = 22  # Size of the presence table that screens window hashes before the sorted lookup
+
+    def __init__(self, filter_sequences, overlapping=False):
+        """
+        Hash the filter sequences, grouped by length.
+
+        With overlapping=False the occurrences of each filter are counted like str.count (non-overlapping,
+        leftmost first); with overlapping=True every occurrence is counted.
+        """
+        self.filter_sequences = list(filter_sequences)
+        if not self.supports(self.filter_sequences):
+            raise ValueError(f"KmerMatcher only supports A/C/G/T filters of 1 to {self.max_length} bases.")
+        self.overlapping = overlapping
+        self.lengths = np.array([len(filter_seq) for filter_seq in self.filter_sequences], dtype=np.int64)
+
+        groups = {}
+        for position, filter_seq in enumerate(self.filter_sequences):
+            groups.setdefault(len(filter_seq), []).append(position)
+
+        # Per filter length: a presence table indexed by the low bits of the hashes, the sorted distinct hashes,
+        # and for each of them the range of filter positions sharing it (identical filter sequences)
+        self.tables = {}
+        for length, positions in sorted(groups.items()):
+            hashes = np.array([self._hash(self.filter_sequences[position]) for position in positions], dtype=np.uint64)
+            order = np.argsort(hashes, kind="stable")
+            hashes = hashes[order]
+            distinct, first = np.unique(hashes, return_index=True)
+            mask = np.uint64((1 << min(2 * length, self.presence_bits)) - 1)
+            presence = np.zeros(int(mask) + 1, dtype=bool)
+            presence[distinct & mask] = True
+            self.tables[length] = (mask, presence, distinct, np.append(first, len(hashes)),
+                                   np.asarray(positions, dtype=np.int64)[order])
+
+    @classmethod
+    def supports(cls, filter_sequences):
+        """
+        Check whether all filter sequences can be hashed by the k-mer engine.
+        """
+        return all(0 < len(filter_seq) <= cls.max_length and set(filter_seq) <= set("ACGT")
+                   for filter_seq in filter_sequences)
+
+    @staticmethod
+    def _hash(filter_seq):
+        value = 0
+        for base in filter_seq.encode("ascii"):
+            value = (value << 2) | int(_ENCODE[base])
+        return value
+
+    def scan(self, sequence):
+        """
+        Return a list of (filter position, occurrences) pairs for the filters found in the sequence,
+        ordered by filter position.
+        """
+        _, filter_positions, occurrences = self.scan_batch([sequence])
+        return list(zip(filter_positions.tolist(), occurrences.tolist()))
+
+    def scan_batch(self, sequences):
+        """
+        Scan a batch of sequences (strings or PackedSequences) and return flat (sequence index, filter position,
+        occurrences) arrays, ordered by sequence and then filter position.
+
+        The batch is packed and matched in slices of consecutive sequences totalling at most max_slice_bases
+        bases (or a single longer sequence), so memory depends on the slice size rather than the batch size.
+        """
+        if isinstance(sequences, PackedSequences):
+            packed, ends = sequences, sequences.offsets[1:]
+        else:
+            packed, sequences = None, list(sequences)
+            ends = np.cumsum(np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64,
+                                         count=len(sequences)))
+        results = []
+        start = 0
+        while start < len(ends) or not results:
+            first_base = ends[start - 1] if start else 0
+            stop = max(start + 1, int(np.searchsorted(ends, first_base + self.max_slice_bases, side="right")))
+            if packed is None:
+                batch = PackedSequences.from_sequences(sequences[start:stop])
+            else:
+                batch = packed if start == 0 and stop >= len(packed) else packed.slice(start, stop)
+            sequence_indices, filter_positions, occurrences = self.match(batch)
+            results.append((sequence_indices + start, filter_positions, occurrences))
+            start = stop
+        if len(results) == 1:
+            return results[0]
+        return tuple(np.concatenate(columns) for columns in zip(*results))
+
+    def match(self, packed):
+        """
+        Match all filters against a PackedSequences store, see scan_batch.
+        """
+        codes = packed.codes()
+        n_bases = len(codes)
+        sequence_of_base = np.repeat(np.arange(len(packed), dtype=np.int64), packed.lengths)
+        ambiguous_before = np.zeros(n_bases + 1, dtype=np.int64)
+        np.cumsum(codes == AMBIGUOUS, out=ambiguous_before[1:])
+        wide_codes = codes.astype(np.uint64)
+
+        hit_sequences, hit_filters, hit_starts = [], [], []
+        for length, (mask, presence, hashes, bounds, positions) in self.tables.items():
+            n_windows = n_bases - length + 1
+            if n_windows <= 0:
+                continue
+
+            # Rolling hash of every window of the concatenated sequences, one vector operation per base of the k-mer
+            window_hashes = np.zeros(n_windows, dtype=np.uint64)
+            for offset in range(length):
+                window_hashes <<= np.uint64(2)
+                window_hashes |= wide_codes[offset:offset + n_windows]
+
+            # Keep windows inside a single sequence, without ambiguous bases and passing the presence screen
+            valid = ((sequence_of_base[:n_windows] == sequence_of_base[length - 1:])
+                     & (ambiguous_before[length:] == ambiguous_before[:n_windows])
+                     & presence[window_hashes & mask])
+            starts = np.flatnonzero(valid)
+            slots = np.minimum(np.searchsorted(hashes, window_hashes[starts]), len(hashes) - 1)
+            found = hashes[slots] == window_hashes[starts]
+            starts, slots = starts[found], slots[found]
+
+            # Expand every hit to all the filters sharing the hashed sequence
+            per_slot = bounds[slots + 1] - bounds[slots]
+            first_entry = np.repeat(bounds[slots] - (np.cumsum(per_slot) - per_slot), per_slot)
+            entries = first_entry + np.arange(per_slot.sum(), dtype=np.int64)
+            starts = np.repeat(starts, per_slot)
+
+            hit_sequences.append(sequence_of_base[starts])
+            hit_filters.append(positions[entries])
+            hit_starts.append(starts)
+
+        if not hit_sequences:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+
+        hit_sequences = np.concatenate(hit_sequences)
+        hit_filters = np.concatenate(hit_filters)
+        hit_starts = np.concatenate(hit_starts)
+        order = np.lexsort((hit_starts, hit_filters, hit_sequences))
+        hit_sequences, hit_filters, hit_starts = hit_sequences[order], hit_filters[order], hit_starts[order]
+
+        # One group per (sequence, filter) pair
+        new_group = np.ones(len(order), dtype=bool)
+        new_group[1:] = (hit_sequences[1:] != hit_sequences[:-1]) | (hit_filters[1:] != hit_filters[:-1])
+        group_starts = np.flatnonzero(new_group)
+        occurrences = np.diff(np.append(group_starts, len(order)))
+
+        if not self.overlapping:
+            # Only groups with two hits closer than the filter length need the greedy str.count selection
+            too_close = ~new_group[1:] & (np.diff(hit_starts) < self.lengths[hit_filters[1:]])
+            group_of_hit = np.cumsum(new_group) - 1
+            for group in np.unique(group_of_hit[1:][too_close]):
+                start, stop = group_starts[group], group_starts[group] + occurrences[group]
+                length = self.lengths[hit_filters[start]]
+                count, next_start = 0, -1
+                for hit_start in hit_starts[start:stop].tolist():
+                    if hit_start >= next_start:
+                        count += 1
+                        next_start = hit_start + length
+                occurrences[group] = count
+
+        return hit_sequences[group_starts], hit_filters[group_starts], occurrences.astype(np.int64)
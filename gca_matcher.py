@@ -0,0 +1,446 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from gca_incidence import IncidenceMatrix
+from gca_kmer import PackedReads
+from gca_multihits import DEFAULT_MAX_BYTES, MultiHitStore
+import numpy as np
+import pandas as pd
+
+
+COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+
+
+def reverse_complement(sequence):
+    """
+    Return the reverse complement of a nucleotide sequence, other characters are kept as they are.
+    """
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+class FilterMatcher:
+    """
+    Multi-pattern matcher that compiles all filter sequences into a single Aho-Corasick automaton,
+    so every cocktail sequence is scanned once regardless of how many filters there are.
+    """
+
+    def __init__(self, filter_sequences, overlapping=False):
+        """
+        Compile the automaton for the given filter sequences.
+
+        With overlapping=False the occurrences of each filter are counted like str.count (non-overlapping,
+        leftmost first); with overlapping=True every occurrence is counted.
+        """
+        self.filter_sequences = list(filter_sequences)
+        self.overlapping = overlapping
+        self.lengths = [len(filter_seq) for filter_seq in self.filter_sequences]
+        self._build()
+
+    def _build(self):
+        """
+        Build the trie, the failure links and the resulting full transition table.
+        """
+        goto = [{}]
+        outputs = [[]]
+        for position, filter_seq in enumerate(self.filter_sequences):
+            state = 0
+            for char in filter_seq:
+                if char not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            outputs[state].append(position)
+
+        # Breadth-first pass over the trie: failure links are folded into the transition table, so the scan
+        # never has to follow them, and the outputs of each state include those of its failure state
+        alphabet = {char for filter_seq in self.filter_sequences for char in filter_seq}
+        fail = [0] * len(goto)
+        delta = [dict(node) for node in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char in alphabet:
+                child = goto[state].get(char)
+                if child is not None:
+                    fail[child] = delta[fail[state]].get(char, 0)
+                    outputs[child] = outputs[child] + outputs[fail[child]]
+                    queue.append(child)
+                else:
+                    target = delta[fail[state]].get(char, 0)
+                    if target:
+                        delta[state][char] = target
+
+        self._delta = delta
+        self._outputs = [sorted(output) if output else None for output in outputs]
+
+    def scan(self, sequence):
+        """
+        Return a list of (filter position, occurrences) pairs for the filters found in the sequence,
+        ordered by filter position.
+        """
+        delta = self._delta
+        outputs = self._outputs
+        counts = {}
+        state = 0
+
+        if self.overlapping:
+            for char in sequence:
+                state = delta[state].get(char, 0)
+                output = outputs[state]
+                if output:
+                    for position in output:
+                        counts[position] = counts.get(position, 0) + 1
+        else:
+            # Greedy leftmost selection per filter reproduces str.count semantics
+            lengths = self.lengths
+            next_start = {}
+            for end, char in enumerate(sequence, 1):
+                state = delta[state].get(char, 0)
+                output = outputs[state]
+                if output:
+                    for position in output:
+                        if end - lengths[position] >= next_start.get(position, 0):
+                            counts[position] = counts.get(position, 0) + 1
+                            next_start[position] = end
+
+        return sorted(counts.items())
+
+    def scan_batch(self, sequences):
+        """
+        Scan a batch of sequences and return flat (sequence index, filter position, occurrences) arrays,
+        ordered by sequence and then filter position.
+        """
+        return scan_each(self.scan, sequences)
+
+
+def scan_each(scan, sequences):
+    """
+    Apply a per-sequence scan to a batch of sequences and flatten the results into (sequence index,
+    filter position, occurrences) arrays.
+    """
+    sequence_indices, filter_positions, occurrences = [], [], []
+    for index, sequence in enumerate(sequences):
+        for filter_position, count in scan(sequence):
+            sequence_indices.append(index)
+            filter_positions.append(filter_position)
+            occurrences.append(count)
+    return (np.array(sequence_indices, dtype=np.int64), np.array(filter_positions, dtype=np.int64),
+            np.array(occurrences, dtype=np.int64))
+
+
+class ApproximateMatcher:
+    """
+    Bit-parallel matcher for filter occurrences with 1 up to max_mismatches substitutions (Hamming distance).
+
+    All filters are laid side by side in one wide integer and searched together with the Shift-And algorithm
+    extended to mismatches (one state vector per number of mismatches), so every sequence is scanned once with a
+    constant number of integer operations per character.
+    """
+
+    def __init__(self, filter_sequences, max_mismatches, overlapping=False):
+        """
+        Compile the character masks. max_mismatches holds the maximum number of mismatches of every filter
+        (0 disables approximate matching for that filter), it is capped below the filter length.
+        """
+        self.filter_sequences = list(filter_sequences)
+        self.max_mismatches = [min(mismatches, len(filter_seq) - 1) if filter_seq else 0
+                               for filter_seq, mismatches in zip(self.filter_sequences, max_mismatches)]
+        self.overlapping = overlapping
+        self.lengths = [len(filter_seq) for filter_seq in self.filter_sequences]
+        self.max_errors = max(self.max_mismatches, default=0)
+
+        self.char_masks = {}
+        self.start_mask = 0
+        self.end_bits = {}  # Bit of the last character of a filter -> filter position
+        offset = 0
+        for position, (filter_seq, mismatches) in enumerate(zip(self.filter_sequences, self.max_mismatches)):
+            if not mismatches:
+                continue
+            self.start_mask |= 1 << offset
+            for index, char in enumerate(filter_seq):
+                self.char_masks[char] = self.char_masks.get(char, 0) | 1 << (offset + index)
+            self.end_bits[offset + len(filter_seq) - 1] = position
+            offset += len(filter_seq)
+        self.width_mask = (1 << offset) - 1
+
+        # End bits of the filters accepting e mismatches, for every e
+        self.accept_masks = [0] * (self.max_errors + 1)
+        for bit, position in self.end_bits.items():
+            for errors in range(1, self.max_mismatches[position] + 1):
+                self.accept_masks[errors] |= 1 << bit
+
+    def scan(self, sequence):
+        """
+        Return a list of (filter position, approximate occurrences) pairs ordered by filter position. Exact
+        occurrences are not included.
+        """
+        char_masks = self.char_masks
+        start_mask = self.start_mask
+        width_mask = self.width_mask
+        accept_masks = self.accept_masks
+        states = [0] * (self.max_errors + 1)
+        counts = {}
+        next_start = {}
+
+        for end, char in enumerate(sequence, 1):
+            char_mask = char_masks.get(char, 0)
+            previous = 0  # State of the previous error level before this character
+            for errors in range(len(states)):
+                state = states[errors]
+                shifted = (state << 1) | start_mask
+                states[errors] = (shifted & char_mask) | (((previous << 1) | start_mask) & width_mask if errors else 0)
+                previous = state
+
+            # Filters ending here with exactly 1..max_mismatches substitutions
+            for errors in range(1, len(states)):
+                hits = states[errors] & ~states[errors - 1] & accept_masks[errors]
+                while hits:
+                    lowest = hits & -hits
+                    position = self.end_bits[lowest.bit_length() - 1]
+                    hits ^= lowest
+                    if self.overlapping or end - self.lengths[position] >= next_start.get(position, 0):
+                        counts[position] = counts.get(position, 0) + 1
+                        next_start[position] = end
+
+        return sorted(counts.items())
+
+    def scan_batch(self, sequences):
+        """
+        Scan a batch of sequences and return flat (sequence index, filter position, approximate occurrences)
+        arrays, ordered by sequence and then filter position.
+        """
+        return scan_each(self.scan, sequences)
+
+
+class MatchAccumulator:
+    """
+    Running filter match counters, updated one batch of cocktail sequences at a time. The counters of every batch
+    are derived from its incidence matrix; with keep_incidence the row-level matrices are kept as well.
+    """
+
+    def __init__(self, filter_ids, matcher, keep_incidence=False, approximate_matcher=None, strand_positions=None,
+                 multi_hit_bytes=DEFAULT_MAX_BYTES, options=None):
+        """
+        Start empty counters for the given filter IDs, ordered like the filter sequences of the matcher.
+        With an approximate_matcher, approximate occurrences are counted separately from the exact ones.
+        The reads with multiple matches spill to disk beyond multi_hit_bytes, see MultiHitStore.
+
+        For both-strand matching the matchers also hold reverse complements: strand_positions maps every matcher
+        position to its filter position, positions beyond the filters being reverse strand patterns.
+
+        options records the matching options the matchers were compiled with, see
+        GeneCocktailAnalyser.build_accumulator.
+        """
+        self.filter_ids = list(filter_ids)
+        self.matcher = matcher
+        self.keep_incidence = keep_incidence
+        self.approximate_matcher = approximate_matcher
+        self.strand_positions = strand_positions
+        self.multi_hit_bytes = multi_hit_bytes
+        self.options = options
+        self.rows = 0  # Non-NaN rows seen so far, the positional offset of the next batch
+        self.nan_rows = 0
+        self.total_samples = 0
+        self.samples_with_match = 0
+        self.matches_count = {filter_id: 0 for filter_id in self.filter_ids}
+        self.multiple_hits = {filter_id: 0 for filter_id in self.filter_ids}
+        self.multiple_filter_ids = MultiHitStore(self.filter_ids, multi_hit_bytes)
+        self.incidence_blocks = []
+        self.approximate_matches_count = {filter_id: 0 for filter_id in self.filter_ids}
+        self.samples_with_approximate_match = 0
+        self.reverse_matches_count = {filter_id: 0 for filter_id in self.filter_ids}
+
+    def spawn(self):
+        """
+        Return an empty accumulator with the same filters, matchers and options.
+        """
+        return MatchAccumulator(self.filter_ids, self.matcher, self.keep_incidence, self.approximate_matcher,
+                                self.strand_positions, self.multi_hit_bytes, self.options)
+
+    def collapse_strands(self, sequence_indices, matcher_positions, occurrences):
+        """
+        Attribute hits on reverse complement patterns to their filter. Return the (sequence index, filter position,
+        occurrences) arrays with both strands summed, and the reverse strand part of the occurrences.
+        """
+        n_filters = len(self.filter_ids)
+        keys = sequence_indices * n_filters + self.strand_positions[matcher_positions]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        reverse_occurrences = np.where(matcher_positions >= n_filters, occurrences, 0)
+        summed = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(summed, inverse, occurrences)
+        reverse = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(reverse, inverse, reverse_occurrences)
+        return keys // n_filters, keys % n_filters, summed, reverse
+
+    def update(self, sequences, counts=None):
+        """
+        Match a batch of sequences (a pandas Series, NaNs allowed, or gca_kmer.PackedReads) and add it to the
+        counters.
+
+        Each row is weighted by 1, or by its read count when the matching counts Series is given.
+        """
+        # Collapse identical sequences, each distinct sequence is matched once and weighted by its multiplicity
+        if isinstance(sequences, PackedReads):
+            nan_mask = sequences.isna()
+            sequence_codes, unique_sequences = sequences.codes[~nan_mask].astype(np.int64), sequences.distinct
+        else:
+            nan_mask = sequences.isna().to_numpy()
+            sequence_codes, unique_sequences = pd.factorize(sequences[~nan_mask])
+        self.nan_rows += int(nan_mask.sum())
+        row_weights = None
+        if counts is not None:
+            row_weights = pd.to_numeric(counts[~nan_mask], errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+            multiplicity = np.bincount(sequence_codes, weights=row_weights, minlength=len(unique_sequences))
+        else:
+            multiplicity = np.bincount(sequence_codes, minlength=len(unique_sequences))
+
+        # Incidence matrix of the distinct sequences, weighted by their multiplicity
+        sequence_indices, filter_positions, occurrences = self.matcher.scan_batch(unique_sequences)
+        if self.strand_positions is not None:
+            sequence_indices, filter_positions, occurrences, reverse = self.collapse_strands(
+                sequence_indices, filter_positions, occurrences)
+            reverse_totals = np.zeros(len(self.filter_ids), dtype=np.int64)
+            np.add.at(reverse_totals, filter_positions, reverse * multiplicity[sequence_indices].astype(np.int64))
+            for filter_id, total in zip(self.filter_ids, reverse_totals.tolist()):
+                self.reverse_matches_count[filter_id] += total
+        unique_incidence = IncidenceMatrix.from_hits(len(unique_sequences), len(self.filter_ids), sequence_indices,
+                                                     filter_positions, occurrences, multiplicity.astype(np.int64))
+        self.add_incidence(unique_incidence)
+
+        # Expand the multiple filter matches back to the global position of every row carrying the sequence
+        multi_hit_rows = np.flatnonzero(unique_incidence.multi_hit_rows()[sequence_codes])
+        if len(multi_hit_rows):
+            multi_hits = unique_incidence.take_rows(sequence_codes[multi_hit_rows])
+            self.multiple_filter_ids.extend(self.rows + multi_hit_rows, multi_hits.indptr, multi_hits.indices)
+
+        if self.keep_incidence:
+            self.incidence_blocks.append(unique_incidence.take_rows(sequence_codes, row_weights))
+
+        # Approximate occurrences, and the samples they rescue from having no exact filter match
+        if self.approximate_matcher is not None:
+            sequence_indices, filter_positions, occurrences = self.approximate_matcher.scan_batch(unique_sequences)
+            if self.strand_positions is not None:
+                sequence_indices, filter_positions, occurrences, _ = self.collapse_strands(
+                    sequence_indices, filter_positions, occurrences)
+            approximate_incidence = IncidenceMatrix.from_hits(len(unique_sequences), len(self.filter_ids),
+                                                              sequence_indices, filter_positions, occurrences,
+                                                              unique_incidence.weights)
+            for filter_id, total in zip(self.filter_ids, approximate_incidence.filter_totals().tolist()):
+                self.approximate_matches_count[filter_id] += total
+            rescued = approximate_incidence.matched_rows() & ~unique_incidence.matched_rows()
+            self.samples_with_approximate_match += int(unique_incidence.weights[rescued].sum())
+
+        self.rows += len(sequence_codes)
+        self.total_samples += int(row_weights.sum()) if row_weights is not None else len(sequence_codes)
+
+    def add_incidence(self, incidence):
+        """
+        Add the filter totals and matched samples of a weighted incidence matrix to the counters.
+        """
+        filter_totals = incidence.filter_totals().tolist()
+        repeated_totals = incidence.filter_totals(repeated_only=True).tolist()
+        for filter_id, total, repeated_total in zip(self.filter_ids, filter_totals, repeated_totals):
+            self.matches_count[filter_id] += total
+            self.multiple_hits[filter_id] += repeated_total
+        self.samples_with_match += int(incidence.row_weights()[incidence.matched_rows()].sum())
+
+    def merge(self, other):
+        """
+        Add the counters of an accumulator that processed the batch directly following the rows seen so far,
+        remapping its multi-hit positions to global row positions.
+        """
+        for filter_id, count in other.matches_count.items():
+            self.matches_count[filter_id] += count
+        for filter_id, count in other.multiple_hits.items():
+            self.multiple_hits[filter_id] += count
+        self.multiple_filter_ids.merge(other.multiple_filter_ids, self.rows)
+        self.incidence_blocks.extend(other.incidence_blocks)
+        for filter_id, count in other.approximate_matches_count.items():
+            self.approximate_matches_count[filter_id] += count
+        self.samples_with_approximate_match += other.samples_with_approximate_match
+        for filter_id, count in other.reverse_matches_count.items():
+            self.reverse_matches_count[filter_id] += count
+
+        self.rows += other.rows
+        self.nan_rows += other.nan_rows
+        self.total_samples += other.total_samples
+        self.samples_with_match += other.samples_with_match
+
+    def incidence(self):
+        """
+        Return the row-level incidence matrix of all rows seen so far, None unless keep_incidence is set.
+        """
+        if not self.keep_incidence:
+            return None
+        if len(self.incidence_blocks) > 1:
+            self.incidence_blocks = [IncidenceMatrix.vstack(self.incidence_blocks, len(self.filter_ids))]
+        return self.incidence_blocks[0] if self.incidence_blocks else IncidenceMatrix.vstack([], len(self.filter_ids))
+
+    def summary(self, count_multiple_hits=True):
+        """
+        Return the counters in the layout of GeneCocktailAnalyser.results. Approximate occurrences are only reported
+        in approximate_filter_matches, with samples_with_approximate_match counting the samples with approximate
+        but no exact matches. For both strands, filter_matches_by_strand splits the matches into "+" and "-".
+        """
+        results = {
+            "nan_rows": self.nan_rows,
+            "total_samples": self.total_samples,
+            "filter_matches": self.matches_count,
+            "samples_with_match": self.samples_with_match,
+            "no_filter_match": self.total_samples - self.samples_with_match,
+            "two_or_more_matches": len([count for count in self.matches_count.values() if count >= 2]),
+        }
+        if count_multiple_hits:
+            results["multiple_hits"] = self.multiple_hits
+        if self.approximate_matcher is not None:
+            results["approximate_filter_matches"] = self.approximate_matches_count
+            results["samples_with_approximate_match"] = self.samples_with_approximate_match
+        if self.strand_positions is not None:
+            results["filter_matches_by_strand"] = {
+                filter_id: {"+": self.matches_count[filter_id] - self.reverse_matches_count[filter_id],
+                            "-": self.reverse_matches_count[filter_id]}
+                for filter_id in self.matches_count
+            }
+        return results
+
+
+# Empty accumulator holding the matchers compiled by the parent process, set once per worker process by the pool
+# initializer
+_worker_template = None
+
+
+def _init_worker(template):
+    global _worker_template
+    _worker_template = template
+
+
+def _match_batch(sequences, counts):
+    accumulator = _worker_template.spawn()
+    accumulator.multiple_filter_ids.max_bytes = np.inf  # Sent back whole, the parent store spills if needed
+    accumulator.update(sequences, counts)
+    accumulator.matcher = None  # The parent already holds the matchers, don't send them back
+    accumulator.approximate_matcher = None
+    return accumulator
+
+
+def accumulate_parallel(accumulator, batches, workers, on_merge=None):
+    """
+    Match (sequences, counts) batches on a pool of worker processes and merge the results into the accumulator
+    in submission order, so the outcome is identical to a sequential run. At most 2 * workers batches are in flight.
+    on_merge is called with the accumulator after every merged batch; if it raises, queued batches are cancelled.
+    """
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(accumulator.spawn(),))
+    try:
+        pending = deque()
+        for sequences, counts in batches:
+            pending.append(executor.submit(_match_batch, sequences, counts))
+            while len(pending) >= 2 * workers or (pending and pending[0].done()):
+                accumulator.merge(pending.popleft().result())
+                if on_merge is not None:
+                    on_merge(accumulator)
+        while pending:
+            accumulator.merge(pending.popleft().result())
+            if on_merge is not None:
+                on_merge(accumulator)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
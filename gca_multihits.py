@@ -0,0 +1,219 @@
+from collections.abc import Mapping
+from gca_incidence import IncidenceMatrix
+import contextlib
+import numpy as np
+import os
+import shutil
+import tempfile
+import threading
+
+DEFAULT_MAX_BYTES = 1 << 28  # Memory held by the multi-hit records before they spill to disk
+SEGMENT_COLUMNS = ("rows", "indptr", "positions")
+
+_pickling = threading.local()
+
+
+@contextlib.contextmanager
+def pickled_segments(directory):
+    """
+    Within the block, pickling a MultiHitStore links (or copies) its spilled segments into directory and the pickle
+    references them there, so that it stays loadable once the store and its temporary spill directory are gone.
+    """
+    previous = getattr(_pickling, "directory", None)
+    _pickling.directory = directory
+    try:
+        yield
+    finally:
+        _pickling.directory = previous
+
+
+def link_segment(prefix, directory):
+    """
+    Hard-link the .npy columns of a segment into directory (copying them where links are not supported), return
+    the prefix of the linked segment.
+    """
+    os.makedirs(directory, exist_ok=True)
+    linked_prefix = os.path.join(directory, os.path.basename(prefix))
+    for name in SEGMENT_COLUMNS:
+        source, target = f"{prefix}_{name}.npy", f"{linked_prefix}_{name}.npy"
+        if os.path.exists(target):
+            if os.path.samefile(source, target):
+                continue
+            os.remove(target)  # Left by another store, e.g. an earlier checkpoint under the same name
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+    return linked_prefix
+
+
+class MultiHitStore(Mapping):
+    """
+    Bounded-memory store of the reads with multiple filter matches, a read mapping {row: [filter IDs]} filled in
+    increasing row order.
+
+    Records are kept in columnar blocks (rows, CSR offsets and filter positions). Once they take more than
+    max_bytes, the blocks are written to the spill directory (a temporary one by default) as one segment of .npy
+    columns, which are memory-mapped back for ordered iteration, lookups and aggregate queries.
+
+    Pickles only hold the in-memory blocks and reference the spilled segment files, pickle the store within
+    pickled_segments to keep these files next to the pickle.
+    """
+
+    def __init__(self, filter_ids, max_bytes=DEFAULT_MAX_BYTES, spill_directory=None):
+        self.filter_ids = list(filter_ids)
+        self.max_bytes = max_bytes
+        self.spill_directory = spill_directory
+        self._temporary_directory = None
+        self.segments = []  # (first row, last row, segment file prefix)
+        self.blocks = []  # In-memory (rows, indptr, positions) blocks
+        self.nbytes = 0
+        self.length = 0
+
+    def __getstate__(self):
+        # Spilled segments are referenced rather than loaded back, from the pickled_segments directory if any
+        directory = getattr(_pickling, "directory", None)
+        segments = self.segments
+        if directory is not None:
+            segments = [(first, last, link_segment(prefix, directory)) for first, last, prefix in segments]
+        return dict(self.__dict__, _temporary_directory=None, segments=segments)
+
+    def _spill_path(self):
+        directory = self.spill_directory
+        if directory is None:
+            if self._temporary_directory is None:
+                self._temporary_directory = tempfile.TemporaryDirectory(prefix="gca_multihits_")
+            directory = self._temporary_directory.name
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def localize(self):
+        """
+        Link the spilled segments referenced from elsewhere (e.g. those of a loaded pickle) into the spill
+        directory of the store, so that it no longer depends on these files.
+        """
+        directory = self._spill_path()
+        self.segments = [(first, last, prefix if os.path.dirname(prefix) == directory else
+                          link_segment(prefix, directory)) for first, last, prefix in self.segments]
+
+    @staticmethod
+    def _block_nbytes(block):
+        return sum(column.nbytes for column in block)
+
+    @staticmethod
+    def _concatenate(blocks):
+        offsets = np.cumsum([0] + [len(positions) for _, _, positions in blocks])
+        rows = np.concatenate([rows for rows, _, _ in blocks])
+        indptr = np.concatenate([np.zeros(1, dtype=np.int64)]
+                                + [indptr[1:] + offset for (_, indptr, _), offset in zip(blocks, offsets)])
+        return rows, indptr, np.concatenate([positions for _, _, positions in blocks])
+
+    def extend(self, rows, indptr, positions):
+        """
+        Add records for increasing rows, following the rows already stored: the filter positions of row i are
+        positions[indptr[i]:indptr[i + 1]].
+        """
+        if not len(rows):
+            return
+        block = (np.asarray(rows, dtype=np.int64), np.asarray(indptr, dtype=np.int64),
+                 np.asarray(positions, dtype=np.int32))
+        self.blocks.append(block)
+        self.nbytes += self._block_nbytes(block)
+        self.length += len(rows)
+        if self.nbytes > self.max_bytes:
+            self.spill()
+
+    def merge(self, other, row_offset=0):
+        """
+        Add the records of another store, shifting its rows by row_offset.
+        """
+        for rows, indptr, positions in other.iter_blocks():
+            self.extend(rows + row_offset, indptr, positions)
+
+    def spill(self):
+        """
+        Write the in-memory blocks to disk as a new segment.
+        """
+        if not self.blocks:
+            return
+        columns = self._concatenate(self.blocks)
+        prefix = os.path.join(self._spill_path(), f"segment_{len(self.segments):06d}")
+        for name, column in zip(SEGMENT_COLUMNS, columns):
+            np.save(f"{prefix}_{name}.npy", column)
+        rows = columns[0]
+        self.segments.append((int(rows[0]), int(rows[-1]), prefix))
+        self.blocks = []
+        self.nbytes = 0
+
+    @staticmethod
+    def _load_segment(prefix):
+        return tuple(np.load(f"{prefix}_{name}.npy", mmap_mode="r") for name in SEGMENT_COLUMNS)
+
+    def iter_blocks(self):
+        """
+        Yield the (rows, indptr, positions) blocks in row order, spilled segments being memory-mapped.
+        """
+        for _, _, prefix in self.segments:
+            yield self._load_segment(prefix)
+        yield from self.blocks
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for rows, _, _ in self.iter_blocks():
+            yield from rows.tolist()
+
+    def items(self):
+        """
+        Iterate over (row, [filter IDs]) in row order, one block in memory at a time.
+        """
+        for rows, indptr, positions in self.iter_blocks():
+            filter_ids = [self.filter_ids[position] for position in positions.tolist()]
+            bounds = indptr.tolist()
+            for index, row in enumerate(rows.tolist()):
+                yield row, filter_ids[bounds[index]:bounds[index + 1]]
+
+    def values(self):
+        for _, filter_ids in self.items():
+            yield filter_ids
+
+    def __getitem__(self, row):
+        blocks = [self._load_segment(prefix) for first, last, prefix in self.segments if first <= row <= last]
+        for rows, indptr, positions in blocks + self.blocks:
+            index = int(np.searchsorted(rows, row))
+            if index < len(rows) and rows[index] == row:
+                return [self.filter_ids[position] for position in positions[indptr[index]:indptr[index + 1]].tolist()]
+        raise KeyError(row)
+
+    def filter_counts(self):
+        """
+        Return the number of records hitting every filter, in filter position order.
+        """
+        counts = np.zeros(len(self.filter_ids), dtype=np.int64)
+        for _, _, positions in self.iter_blocks():
+            counts += np.bincount(positions, minlength=len(self.filter_ids))
+        return counts
+
+    def size_counts(self):
+        """
+        Return {number of filters hit: number of records}.
+        """
+        sizes = {}
+        for _, indptr, _ in self.iter_blocks():
+            values, counts = np.unique(np.diff(indptr), return_counts=True)
+            for value, count in zip(values.tolist(), counts.tolist()):
+                sizes[value] = sizes.get(value, 0) + count
+        return sizes
+
+    def cooccurrence(self):
+        """
+        Return the filter x filter matrix counting the records where two filters occur together (diagonal included),
+        in filter position order.
+        """
+        matrix = np.zeros((len(self.filter_ids), len(self.filter_ids)), dtype=np.int64)
+        for rows, indptr, positions in self.iter_blocks():
+            incidence = IncidenceMatrix(np.asarray(indptr), np.asarray(positions),
+                                        np.ones(len(positions), dtype=np.int32), len(self.filter_ids))
+            matrix += incidence.cooccurrence()
+        return matrix
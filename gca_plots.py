@@ -0,0 +1,224 @@
+from concurrent.futures import ProcessPoolExecutor
+import io
+import numpy as np
+import os
+
+HEATMAP_MAX_FILTERS = 50  # Filters shown on a heatmap before it is reduced
+ANNOTATION_MAX_FILTERS = 25  # Heatmap cells are annotated with their counts up to this many filters
+
+
+def draw_summary_chart(results, dataset_name):
+    """
+    Draw the donut chart of samples with, without and with multiple filter matches as the current figure.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    total_samples = results['total_samples']
+    samples_with_match = total_samples - results['no_filter_match']
+    samples_with_multiple_matches = results['two_or_more_matches']
+
+    # Data for donut chart
+    sizes = [samples_with_match, results['no_filter_match'], samples_with_multiple_matches]
+    labels = ['With Matches', 'Without Matches', 'With Multiple Matches']
+    colors = sns.color_palette("viridis", len(sizes))
+
+    # Plotting
+    figure = plt.figure(figsize=(8, 8))
+    wedges, texts, autotexts = plt.pie(sizes, labels=None, colors=colors, startangle=90,
+                                       wedgeprops={'linewidth': 7, 'edgecolor': 'white'},
+                                       autopct=lambda p: f'{p:.1f}%')  # Display percentages
+
+    for text, label, color in zip(texts, labels, colors):
+        text.set_text(label)  # Set label text
+        text.set_color(color)  # Set label text color to match wedge colors
+        text.set_fontsize(15)  # Adjust font size of labels
+
+    for autotext, color in zip(autotexts, colors):
+        autotext.set_color(color)  # Set percentage text color to match wedge colors
+        autotext.set_fontsize(12)  # Adjust font size of percentages
+
+    plt.gca().add_artist(
+        plt.Circle((0, 0), 0.70, color='white'))  # Draw a white circle at the center to create the donut hole
+
+    plt.title(f'{dataset_name} Summary Chart')
+    plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+    plt.tight_layout()
+    return figure
+
+
+def draw_frequency_histogram(filter_matches, dataset_name, codons=None):
+    """
+    Draw the bar chart of filter matches sorted by count as the current figure, with the bars annotated by their
+    mutation codon when codons ({filter ID: codon}) are given.
+    """
+    import matplotlib.pyplot as plt
+    import natsort
+    import seaborn as sns
+
+    # Getting filter matches and sorting them by count
+    sorted_filter_matches = natsort.natsorted(filter_matches.items(), key=lambda x: x[1], reverse=True)
+    labels = [str(ref) for ref, _ in sorted_filter_matches]
+    values = [count for _, count in sorted_filter_matches]
+
+    # Plotting
+    figure = plt.figure(figsize=(10, 7))  # Adjust the figure size as needed
+    bars = plt.bar(labels, values, color=sns.color_palette("viridis", len(labels)), alpha=0.7)
+
+    if codons is not None:
+        # Calculate dynamic y-axis limit
+        max_value = max(values)
+        y_limit = max_value + max_value * 0.1  # Increase the y-axis limit by 10% of the maximum value
+
+        # Annotate each bar with mutation codons
+        for bar, (ref, _) in zip(bars, sorted_filter_matches):
+            annotation_padding = max_value * 0.02  # 2% of max value
+            x_pos = bar.get_x() + bar.get_width() / 2
+            y_pos = bar.get_height() + annotation_padding
+            ha = 'center'
+            va = 'bottom'
+            plt.text(x_pos, y_pos, codons[ref], ha=ha, va=va, fontsize=15)
+
+        plt.ylim(0, y_limit)
+
+    plt.xlabel('Filters', fontsize=17, labelpad=10)
+    plt.ylabel('Number of Matches', fontsize=17)
+    plt.title(f'Frequency of Filter Matches for {dataset_name}', fontsize=20)
+    plt.xticks(rotation=45, ha='right', fontsize=12)  # Rotate x-axis labels at 45 degrees
+    plt.yticks(fontsize=12)
+    # Set the y-axis tick parameters to point inwards and remove x-axis ticks
+    plt.gca().tick_params(axis='y', direction='in', which='both', length=4)
+    plt.gca().tick_params(axis='x', which='both', bottom=False)  # This line removes the x-axis ticks
+
+    plt.tight_layout()
+    plt.grid(axis='y', linestyle='--', alpha=0.6)
+    return figure
+
+
+def cluster_order(matrix):
+    """
+    Return an ordering of the filters that places filters co-occurring with the same filters next to each other,
+    by spectral seriation (sorting by the Fiedler vector of the graph Laplacian of the co-occurrence matrix).
+    """
+    if len(matrix) < 3:
+        return np.arange(len(matrix))
+    weights = matrix.astype(float)
+    np.fill_diagonal(weights, 0)
+    laplacian = np.diag(weights.sum(axis=1)) - weights
+    _, vectors = np.linalg.eigh(laplacian)
+    return np.argsort(vectors[:, 1], kind="stable")
+
+
+def reduce_heatmap(matrix, labels, max_filters=HEATMAP_MAX_FILTERS, mode="top", cluster=False):
+    """
+    Return the (matrix, labels) to draw for a co-occurrence matrix of possibly many filters.
+
+    Beyond max_filters filters, mode="top" keeps the max_filters filters with the most co-occurrences and
+    mode="downsample" sums the counts of consecutive filters into max_filters groups labelled by their first
+    filter and the number of others, the diagonal of a group counting the co-occurrences within it once. With
+    cluster=True filters are reordered so that similar filters are adjacent (before grouping).
+    """
+    if mode not in ("top", "downsample"):
+        raise ValueError(f"mode should be 'top' or 'downsample'. Found {mode!r} instead.")
+    labels = list(labels)
+
+    if mode == "top" and max_filters is not None and len(labels) > max_filters:
+        totals = matrix.sum(axis=1)
+        keep = np.sort(np.argsort(-totals, kind="stable")[:max_filters])
+        matrix, labels = matrix[np.ix_(keep, keep)], [labels[position] for position in keep.tolist()]
+
+    if cluster:
+        order = cluster_order(matrix)
+        matrix, labels = matrix[np.ix_(order, order)], [labels[position] for position in order.tolist()]
+
+    if mode == "downsample" and max_filters is not None and len(labels) > max_filters:
+        groups = np.arange(len(labels)) * max_filters // len(labels)
+        starts = np.flatnonzero(np.diff(groups, prepend=-1))
+        # Summing the lower triangle counts every pair of filters once, pairs within a group on its diagonal
+        lower = np.add.reduceat(np.add.reduceat(np.tril(matrix), starts, axis=0), starts, axis=1)
+        matrix = lower + np.tril(lower, -1).T
+        bounds = np.append(starts, len(labels))
+        labels = [labels[start] if stop - start == 1 else f"{labels[start]} (+{stop - start - 1})"
+                  for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+    return matrix, labels
+
+
+def draw_heatmap(matrix, labels, annotate=None):
+    """
+    Draw the lower triangle of a co-occurrence matrix as the current figure. Cells are annotated with their
+    counts by default only up to ANNOTATION_MAX_FILTERS filters.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    if annotate is None:
+        annotate = len(labels) <= ANNOTATION_MAX_FILTERS
+
+    # Step 1: Create a mask for the entire matrix
+    mask = np.zeros_like(matrix, dtype=bool)
+
+    # Step 2: Set the upper triangle (including the diagonal) in the mask to True
+    mask[np.triu_indices_from(mask, k=1)] = True  # k=1 excludes the diagonal from the mask
+
+    # Plotting the heatmap with the adjusted mask
+    figure = plt.figure(figsize=(10, 8))
+    heatmap = sns.heatmap(matrix, annot=annotate, cmap="viridis", xticklabels=labels,
+                          yticklabels=labels, mask=mask,  # Use the adjusted mask
+                          cbar_kws={'label': 'Co-occurrence count'})
+    cbar = heatmap.collections[0].colorbar  # Get the colorbar instance
+    cbar.set_label('Co-occurrence count', fontsize=15)  # Set colorbar label font size
+    heatmap.set_title("Filter Co-occurrences in Samples with Multiple Matches", fontsize=15)
+    heatmap.set_xlabel("Filters", fontsize=15)
+    heatmap.set_ylabel("Filters", fontsize=15)
+    return figure
+
+
+def render_images(figure):
+    """
+    Render a figure as {extension: bytes} for its PNG and PDF versions at 300 dpi.
+    """
+    images = {}
+    for extension in ("png", "pdf"):
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format=extension, dpi=300)
+        images[extension] = buffer.getvalue()
+    return images
+
+
+def save_images(images, filename):
+    """
+    Write images rendered by render_images under the given filename (without extension).
+    """
+    os.makedirs(os.path.dirname(filename), exist_ok=True)  # Ensure the plots directory exists
+    for extension, image in images.items():
+        with open(f"{filename}.{extension}", "wb") as f:
+            f.write(image)
+
+
+def _init_renderer():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(draw, args):
+    import matplotlib.pyplot as plt
+
+    figure = draw(*args)
+    try:
+        return render_images(figure)
+    finally:
+        plt.close(figure)
+
+
+def render_figures(jobs, workers=None):
+    """
+    Draw and render (draw function, arguments) jobs concurrently in worker processes using the non-interactive
+    Agg backend, closing every figure once rendered. Return the images of render_images in job order.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if not workers:
+        return []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_renderer) as executor:
+        futures = [executor.submit(_render, draw, args) for draw, args in jobs]
+        return [future.result() for future in futures]
@@ -0,0 +1,226 @@
+import gzip
+import io
+import numpy as np
+import os
+import pandas as pd
+
+FASTQ_EXTENSIONS = (".fastq", ".fq")
+FASTA_EXTENSIONS = (".fasta", ".fa", ".fna")
+COMPRESSED_EXTENSIONS = (".gz", ".bgz")
+BLOCK_SIZE = 1 << 22  # Bytes read from the file at a time
+
+
+def strip_compression_extension(path):
+    """
+    Return the path without a trailing .gz/.bgz extension.
+    """
+    root, extension = os.path.splitext(path)
+    return root if extension.lower() in COMPRESSED_EXTENSIONS else path
+
+
+def sequence_file_format(path):
+    """
+    Return "fastq" or "fasta" for read files (optionally gzip/bgzip compressed), None for anything else.
+    """
+    if not isinstance(path, (str, os.PathLike)):
+        return None
+    extension = os.path.splitext(strip_compression_extension(os.fspath(path)))[1].lower()
+    if extension in FASTQ_EXTENSIONS:
+        return "fastq"
+    if extension in FASTA_EXTENSIONS:
+        return "fasta"
+    return None
+
+
+def open_sequence_file(path):
+    """
+    Open a read file in binary mode, transparently decompressing gzip and bgzip (multi-member gzip) files.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _iter_blocks(path, separator):
+    """
+    Yield the file content in large blocks cut right before the last separator of each block,
+    so that no record is split across blocks.
+    """
+    with open_sequence_file(path) as f:
+        remainder = b""
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            buffer = remainder + block
+            cut = buffer.rfind(separator)
+            if cut <= 0:
+                remainder = buffer
+                continue
+            yield buffer[:cut + 1]
+            remainder = buffer[cut + 1:]
+        if remainder.strip():
+            yield remainder
+
+
+def _to_frame(sequences, columns):
+    """
+    Build a cocktail chunk with one read per row, each counted once.
+    """
+    return pd.DataFrame({columns[0]: sequences, columns[1]: np.ones(len(sequences), dtype=np.int64)})
+
+
+def _quality_filter(sequences, qualities, quality_offset, trim_quality, min_mean_quality, min_length):
+    """
+    Trim low-quality 3' ends and drop short or low-quality reads, vectorized over a block of reads.
+    """
+    lengths = np.fromiter((len(quality) for quality in qualities), dtype=np.int64, count=len(qualities))
+    starts = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=starts[1:])
+    scores = np.frombuffer(b"".join(qualities), dtype=np.uint8).astype(np.int64) - quality_offset
+
+    keep_lengths = lengths.copy()
+    if trim_quality is not None and len(scores):
+        # Position of the last base at or above the threshold in every read, -1 if there is none
+        good_positions = np.where(scores >= trim_quality, np.arange(len(scores)), -1)
+        non_empty = lengths > 0
+        last_good = np.full(len(lengths), -1, dtype=np.int64)
+        last_good[non_empty] = np.maximum.reduceat(good_positions, starts[:-1][non_empty])
+        keep_lengths = np.where(last_good >= starts[:-1], last_good - starts[:-1] + 1, 0)
+
+    keep = keep_lengths > 0
+    if min_length is not None:
+        keep &= keep_lengths >= min_length
+    if min_mean_quality is not None:
+        score_sums = np.zeros(len(scores) + 1, dtype=np.int64)
+        np.cumsum(scores, out=score_sums[1:])
+        totals = score_sums[starts[:-1] + keep_lengths] - score_sums[starts[:-1]]
+        keep &= totals >= min_mean_quality * np.maximum(keep_lengths, 1)
+
+    return [sequence[:length] for sequence, length, kept in zip(sequences, keep_lengths.tolist(), keep.tolist())
+            if kept]
+
+
+def fastq_sequences(lines, quality_offset=33, trim_quality=None, min_mean_quality=None, min_length=None):
+    """
+    Return the sequences of complete FASTQ records given as a list of lines (4 per record), with the optional
+    quality trimming and filtering of read_fastq.
+    """
+    sequences = b"\n".join(lines[1::4]).decode("ascii").split("\n") if lines else []
+    if trim_quality is not None or min_mean_quality is not None or min_length is not None:
+        sequences = _quality_filter(sequences, lines[3::4], quality_offset, trim_quality, min_mean_quality,
+                                    min_length)
+    return sequences
+
+
+def read_fastq(path, columns=("Sequence", "Count"), chunksize=100000, quality_offset=33, trim_quality=None,
+               min_mean_quality=None, min_length=None):
+    """
+    Stream a FASTQ file as cocktail chunks of at most chunksize reads.
+
+    Reads can optionally be trimmed at the 3' end below a Phred score (trim_quality), and dropped when their mean
+    score (min_mean_quality) or their trimmed length (min_length) is too low.
+    """
+    pending = []
+    leftover = []
+    for block in _iter_blocks(path, b"\n"):
+        lines = leftover + (block[:-1] if block.endswith(b"\n") else block).split(b"\n")
+        if b"\r" in block:
+            lines = [line.rstrip(b"\r") for line in lines]
+
+        # Keep incomplete records for the next block
+        complete = len(lines) // 4 * 4
+        lines, leftover = lines[:complete], lines[complete:]
+        if not lines:
+            continue
+
+        pending.extend(fastq_sequences(lines, quality_offset, trim_quality, min_mean_quality, min_length))
+
+        while len(pending) >= chunksize:
+            yield _to_frame(pending[:chunksize], columns)
+            pending = pending[chunksize:]
+
+    if any(line.strip() for line in leftover):
+        raise ValueError(f"Truncated FASTQ record at the end of {path}.")
+    if pending:
+        yield _to_frame(pending, columns)
+
+
+def read_fasta(path, columns=("Sequence", "Count"), chunksize=100000):
+    """
+    Stream a FASTA file (single or multi-line records) as cocktail chunks of at most chunksize reads.
+    """
+    pending = []
+    for block in _iter_blocks(path, b"\n>"):
+        records = block.replace(b"\r", b"").lstrip(b">").split(b"\n>")
+        sequences = [b"".join(record.split(b"\n")[1:]) for record in records if record.strip()]
+        if sequences:
+            pending.extend(b"\n".join(sequences).decode("ascii").split("\n"))
+
+        while len(pending) >= chunksize:
+            yield _to_frame(pending[:chunksize], columns)
+            pending = pending[chunksize:]
+
+    if pending:
+        yield _to_frame(pending, columns)
+
+
+class TailReader:
+    """
+    Follow a growing, uncompressed CSV or FASTQ file: every call to read_new returns the complete records appended
+    since the previous call as a cocktail chunk, and the byte offset of the first unread record is kept in offset.
+    """
+
+    def __init__(self, path, file_format=None, columns=("Sequence", "Count"), read_options=None, offset=0,
+                 header=None):
+        """
+        file_format is "fastq" or None for CSV. To resume a CSV file from a non-zero offset, pass its header
+        (the list of column names) as well.
+        """
+        with open(path, "rb") as f:
+            if f.read(2) == b"\x1f\x8b":
+                raise ValueError(f"Compressed files cannot be followed: {path}.")
+        if file_format not in (None, "fastq"):
+            raise ValueError(f"Only CSV and FASTQ files can be followed. Found {file_format!r} instead.")
+        self.path = path
+        self.file_format = file_format
+        self.columns = columns
+        self.read_options = read_options or {}
+        self.offset = offset
+        self.header = header
+
+    def read_new(self):
+        """
+        Return the records appended since the last call (at most one block of the file), None when there are none
+        yet.
+        """
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < self.offset:
+                raise ValueError(f"{self.path} was truncated while being followed.")
+            f.seek(self.offset)
+            data = f.read(BLOCK_SIZE)
+
+        # Only complete lines are read, a partly written line is picked up on the next call
+        cut = data.rfind(b"\n")
+        if cut < 0:
+            return None
+        lines = data[:cut].split(b"\n")
+        if self.file_format == "fastq":
+            lines = lines[:len(lines) // 4 * 4]
+            if not lines:
+                return None
+            self.offset += sum(len(line) for line in lines) + len(lines)
+            if b"\r" in data:
+                lines = [line.rstrip(b"\r") for line in lines]
+            return _to_frame(fastq_sequences(lines, **self.read_options), self.columns)
+
+        self.offset += cut + 1
+        if self.header is None:
+            self.header = pd.read_csv(io.BytesIO(lines[0]), nrows=0).columns.tolist()
+            lines = lines[1:]
+        if not lines:
+            return None
+        return pd.read_csv(io.BytesIO(b"\n".join(lines)), header=None, names=self.header)
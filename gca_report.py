@@ -0,0 +1,167 @@
+import csv
+import json
+import numpy as np
+import os
+import pandas as pd
+
+REPORT_FORMATS = ("csv", "jsonl", "columnar")
+
+
+def _fraction(count, total):
+    return count / total if total else None
+
+
+def _plain(value):
+    """
+    Convert numpy scalars and missing values to plain JSON/CSV values.
+    """
+    if value is None or (not isinstance(value, str) and pd.isnull(value)):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def summary_records(results):
+    """
+    Return the summary metrics of the results as (metric, value, fraction of the samples) records.
+    """
+    total_samples = results["total_samples"]
+    records = [("total_samples", total_samples, None), ("nan_rows", results["nan_rows"], None)]
+    for metric in ("samples_with_match", "no_filter_match", "two_or_more_matches"):
+        records.append((metric, results[metric], _fraction(results[metric], total_samples)))
+    records.append(("total_filter_matches", sum(results["filter_matches"].values()), None))
+    return records
+
+
+def filter_records(results, filter_index):
+    """
+    Return the matches of every filter as (filter ID, name, mutation codon, matches, fraction of the samples)
+    records, in filter order.
+    """
+    return [(_plain(filter_id), _plain(filter_index.name(filter_id)), _plain(filter_index.codon(filter_id)), count,
+             _fraction(count, results["total_samples"]))
+            for filter_id, count in results["filter_matches"].items()]
+
+
+def multi_hit_blocks(store):
+    """
+    Yield the (rows, indptr, filter positions) blocks of the reads matching several distinct filters, one block of
+    the store at a time.
+    """
+    for rows, indptr, positions in store.iter_blocks():
+        keep = np.flatnonzero(np.diff(indptr) > 1)
+        if len(keep) == len(rows):
+            yield np.asarray(rows), np.asarray(indptr), np.asarray(positions)
+            continue
+        lengths = np.diff(indptr)[keep]
+        kept_indptr = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=kept_indptr[1:])
+        entries = np.repeat(indptr[keep] - kept_indptr[:-1], lengths) + np.arange(kept_indptr[-1], dtype=np.int64)
+        yield np.asarray(rows)[keep], kept_indptr, np.asarray(positions)[entries]
+
+
+def multi_hit_records(store):
+    """
+    Yield (read index, [filter IDs]) for the reads matching several distinct filters, in index order.
+    """
+    filter_ids = [_plain(filter_id) for filter_id in store.filter_ids]
+    for rows, indptr, positions in multi_hit_blocks(store):
+        block_ids = [filter_ids[position] for position in positions.tolist()]
+        bounds = indptr.tolist()
+        for index, row in enumerate(rows.tolist()):
+            yield row, block_ids[bounds[index]:bounds[index + 1]]
+
+
+def _write_csv(filename, header, records):
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(records)
+
+
+def _write_columns(prefix, store):
+    """
+    Write the multi-hit reads as .npy columns (read indices, CSR offsets and filter positions), block by block
+    into memory-mapped files.
+    """
+    n_rows = n_entries = 0
+    for rows, indptr, _ in multi_hit_blocks(store):
+        n_rows += len(rows)
+        n_entries += int(indptr[-1])
+
+    filenames = [f"{prefix}_{name}.npy" for name in ("rows", "indptr", "positions")]
+    columns = [np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=(size,))
+               for filename, dtype, size in zip(filenames, (np.int64, np.int64, np.int32),
+                                                (n_rows, n_rows + 1, n_entries))]
+    out_rows, out_indptr, out_positions = columns
+    out_indptr[0] = 0
+    row_offset = entry_offset = 0
+    for rows, indptr, positions in multi_hit_blocks(store):
+        out_rows[row_offset:row_offset + len(rows)] = rows
+        out_indptr[row_offset + 1:row_offset + len(rows) + 1] = indptr[1:] + entry_offset
+        out_positions[entry_offset:entry_offset + len(positions)] = positions
+        row_offset += len(rows)
+        entry_offset += len(positions)
+    for column in columns:
+        column.flush()
+    return filenames
+
+
+def write_report(prefix, results, filter_index, store, report_format="csv", summary=True):
+    """
+    Stream the report to files named after prefix and return their names. Memory does not depend on the number of
+    reads with multiple filter matches, which are written one store block at a time.
+
+    - "csv": {prefix}_summary.csv, {prefix}_filters.csv and {prefix}_multiple_filter_ids.csv (filter IDs joined
+      by ";").
+    - "jsonl": {prefix}.jsonl, one JSON object per line with a "section" field.
+    - "columnar": the summary and filters CSV files, and the multiple filter matches as .npy columns
+      (rows, indptr, positions), positions referring to the "position" column of the filters file.
+
+    With summary, a short human-readable {prefix}_summary.txt is written as well.
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"report_format should be one of {REPORT_FORMATS}. Found {report_format!r} instead.")
+    os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+    summary_header = ("metric", "value", "fraction")
+    filter_header = ("filter_id", "name", "mutation_codon", "matches", "fraction")
+    filenames = []
+
+    if report_format == "jsonl":
+        filename = f"{prefix}.jsonl"
+        with open(filename, "w") as f:
+            for record in summary_records(results):
+                f.write(json.dumps({"section": "summary", **dict(zip(summary_header, record))}) + "\n")
+            for record in filter_records(results, filter_index):
+                f.write(json.dumps({"section": "filter", **dict(zip(filter_header, record))}) + "\n")
+            for index, filter_ids in multi_hit_records(store):
+                f.write(json.dumps({"section": "multiple_filter_matches", "index": index,
+                                    "filter_ids": filter_ids}) + "\n")
+        filenames.append(filename)
+    else:
+        _write_csv(f"{prefix}_summary.csv", summary_header, summary_records(results))
+        filenames.append(f"{prefix}_summary.csv")
+        if report_format == "csv":
+            _write_csv(f"{prefix}_filters.csv", filter_header, filter_records(results, filter_index))
+            _write_csv(f"{prefix}_multiple_filter_ids.csv", ("index", "filter_ids"),
+                       ((index, ";".join(str(filter_id) for filter_id in filter_ids))
+                        for index, filter_ids in multi_hit_records(store)))
+            filenames.extend([f"{prefix}_filters.csv", f"{prefix}_multiple_filter_ids.csv"])
+        else:
+            positions = {}
+            for position, filter_id in enumerate(store.filter_ids):
+                positions.setdefault(_plain(filter_id), position)
+            _write_csv(f"{prefix}_filters.csv", ("position",) + filter_header,
+                       ((positions[record[0]],) + record for record in filter_records(results, filter_index)))
+            filenames.append(f"{prefix}_filters.csv")
+            filenames.extend(_write_columns(prefix, store))
+
+    if summary:
+        from tabulate import tabulate
+
+        n_multi_hits = sum(len(rows) for rows, _, _ in multi_hit_blocks(store))
+        with open(f"{prefix}_summary.txt", "w") as f:
+            f.write(tabulate(summary_records(results), headers=summary_header) + "\n\n")
+            f.write(tabulate(filter_records(results, filter_index), headers=filter_header) + "\n\n")
+            f.write(f"Reads with multiple filter matches: {n_multi_hits}\n")
+        filenames.append(f"{prefix}_summary.txt")
+    return filenames
@@ -0,0 +1,53 @@
+import time
+
+from gca_readers import TailReader
+
+
+def watch(analyser, report_seconds=60, report_reads=None, poll_seconds=1.0, stop=None, idle_timeout=None,
+          report=None, tail=None, **options):
+    """
+    Follow the cocktail file of the analyser (CSV or FASTQ) while the sequencing pipeline appends to it, adding
+    only the new records to the analysis, and regenerate the report every report_seconds seconds or report_reads
+    reads, whichever comes first.
+
+    Create the analyser with a chunksize so that a CSV file is not loaded upfront (it must already hold its
+    header). The analysis options (see process_data) apply to the first batch of reads, unless the analysis was
+    already started. report defaults to analyser.display_results, which writes the consolidated report under
+    results/.
+
+    Watching ends when the stop event (e.g. a threading.Event) is set, or after idle_timeout seconds without new
+    reads. The report is then regenerated one last time and the TailReader is returned. To resume later, load the
+    saved analysis state (load_state) and pass that TailReader (or one rebuilt with its offset and header) as tail,
+    so that only the records after it are added.
+    """
+    if tail is None:
+        tail = TailReader(analyser.cocktail_file, analyser.cocktail_format, analyser.cocktail_columns[:2],
+                          analyser.read_options)
+    report = report if report is not None else analyser.display_results
+
+    last_report = last_read = time.monotonic()
+    reads_since_report = 0
+    while stop is None or not stop.is_set():
+        chunk = tail.read_new()
+        now = time.monotonic()
+        if chunk is not None and len(chunk):
+            analyser.add_reads(chunk, **options)
+            reads_since_report += len(chunk)
+            last_read = now
+
+        if reads_since_report and analyser.results["total_samples"] and (
+                now - last_report >= report_seconds or (report_reads and reads_since_report >= report_reads)):
+            report()
+            last_report = now
+            reads_since_report = 0
+        elif chunk is None:
+            if idle_timeout is not None and now - last_read >= idle_timeout:
+                break
+            if stop is not None:
+                stop.wait(poll_seconds)
+            else:
+                time.sleep(poll_seconds)
+
+    if reads_since_report and analyser.results["total_samples"]:
+        report()
+    return tail
@@ -1,24 +1,108 @@
-from itertools import combinations
-import matplotlib.pyplot as plt
-import natsort
+from gca_cache import file_digest
+from gca_combinations import combinations_frame, FilterBitsets
+from gca_filters import FilterIndex
+from gca_instrumentation import instrumented, Instrumentation
+from gca_kmer import KmerMatcher, PackedReads
+from gca_matcher import accumulate_parallel, ApproximateMatcher, FilterMatcher, MatchAccumulator, reverse_complement
+from gca_multihits import DEFAULT_MAX_BYTES, MultiHitStore, pickled_segments
+from gca_plots import (draw_frequency_histogram, draw_heatmap, draw_summary_chart, HEATMAP_MAX_FILTERS,
+                       reduce_heatmap, render_figures, render_images, save_images)
+from gca_readers import read_fasta, read_fastq, sequence_file_format, strip_compression_extension
+from gca_report import write_report
+import contextlib
 import numpy as np
 import os
 import pandas as pd
-import seaborn as sns
-from tabulate import tabulate
+import pickle
+import shutil
+import tempfile
+import time
 import warnings
 
+DEFAULT_READ_CHUNKSIZE = 100000  # Reads per chunk when streaming FASTQ/FASTA files
+PROGRESS_BATCH_ROWS = 50000  # Rows per batch of an in-memory table when progress is reported
+STATE_VERSION = 1  # Bump when the layout of saved analysis states changes
+
+
+def write_state(filename, state):
+    """
+    Pickle an analysis state dict to a file, atomically so that an interrupted write keeps the previous state.
+    The spilled segments of multi-hit stores are linked into the {filename}.segments directory, which the state
+    needs as well.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f, pickled_segments(filename + ".segments"):
+        pickle.dump(dict(state, version=STATE_VERSION), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, filename)
+
+
+def read_state(filename):
+    """
+    Load an analysis state dict written by write_state.
+    """
+    with open(filename, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != STATE_VERSION:
+        raise ValueError(f"Unsupported analysis state version in {filename}.")
+    return state
+
+
+def skip_rows(chunks, rows):
+    """
+    Yield the chunks without their first rows in total.
+    """
+    for chunk in chunks:
+        if rows >= len(chunk):
+            rows -= len(chunk)
+            continue
+        yield chunk.iloc[rows:] if rows else chunk
+        rows = 0
+
+
+class ProcessingCancelled(Exception):
+    """
+    Raised by process_data when its cancel event is set.
+    """
+
 
 class GeneCocktailAnalyser:
-    def __init__(self, cocktail_file, filters_file, cocktail_columns=None, filters_columns=None):
+    def __init__(self, cocktail_file, filters_file, cocktail_columns=None, filters_columns=None, chunksize=None,
+                 read_options=None, cache=None, multi_hit_bytes=DEFAULT_MAX_BYTES, instrumentation=None,
+                 filter_index=None, pack_reads=False):
         """
         Initialize the GeneCocktailAnalyser object with the given dataset name, cocktail file, and filters file.
+
+        - cocktail_file, filters_file: paths or in-memory buffers. The cocktail can be a CSV, FASTQ or FASTA file
+          (optionally gzip/bgzip compressed, see gca_readers), and the filters can be a DataFrame.
+        - chunksize: stream the CSV cocktail in chunks of that many rows instead of loading it (FASTQ/FASTA files
+          always stream).
+        - read_options: quality trimming and filtering options for gca_readers.read_fastq.
+        - cache: a gca_cache.ResultCache for process_data; the table is then only loaded on a cache miss.
+        - multi_hit_bytes: memory budget of multiple_filter_ids, see gca_multihits.MultiHitStore.
+        - instrumentation: True or a gca_instrumentation.Instrumentation, recording stage metrics in self.metrics.
+        - filter_index: the index of filters already prepared by another analyser (see prepare_filters), which are
+          then used without validating or preparing them again.
+        - pack_reads: keep a loaded table's sequences as gca_kmer.PackedReads, which engine="kmer" matches as is.
         """
-        self.cocktail = pd.read_csv(cocktail_file)
-        self.filters = pd.read_csv(filters_file)
-        self.dataset_name = os.path.splitext(os.path.basename(cocktail_file))[0].split('_')[0]  # Extract dataset name from file name
+        self.instrumentation = Instrumentation() if instrumentation is True else instrumentation or None
+        self.metrics = self.instrumentation.stages if self.instrumentation is not None else {}
+        self.cocktail_file = cocktail_file
+        self.filters_file = filters_file
+        self.cache = cache
+        self.multi_hit_bytes = multi_hit_bytes
+        self.cocktail_format = sequence_file_format(cocktail_file)
+        self.read_options = read_options if read_options else {}
+        self.chunksize = chunksize if chunksize or not self.cocktail_format else DEFAULT_READ_CHUNKSIZE
+        cocktail_name = cocktail_file if isinstance(cocktail_file, (str, os.PathLike)) else getattr(cocktail_file, "name", "cocktail")  # Buffers may carry a file name
+        self.dataset_name = os.path.splitext(os.path.basename(strip_compression_extension(os.fspath(cocktail_name))))[0].split('_')[0]  # Extract dataset name from file name
         self.results = {}
-        self.multiple_filter_ids = {}
+        self.multiple_filter_ids = MultiHitStore([], multi_hit_bytes)
+        self.filter_index = filter_index
+        self.packed_reads = None
+        self.filters_prepared = filter_index is not None
+        self.accumulator = None
+        self.analysis_options = {}
+        self._incidence = None
 
         # Set default column names if not provided
         self.cocktail_columns = cocktail_columns if cocktail_columns else ["Sequence",
@@ -29,9 +113,129 @@ class GeneCocktailAnalyser:
                                                                         "Filter Sequence",
                                                                         "Mutation Codon"]
 
+        # Read files only provide sequences, CSV files are loaded (or only their header in streaming mode, and until
+        # a cache miss with a cache)
+        self.pack_reads = pack_reads
+        self.cocktail_deferred = cache is not None and not self.chunksize
+        with self.stage("load") as metrics:
+            if self.filters_prepared:
+                self.filters = filters_file
+            elif isinstance(filters_file, pd.DataFrame):
+                self.filters = filters_file.copy()
+            else:
+                self.filters = pd.read_csv(filters_file)
+            if self.cocktail_format:
+                self.cocktail = pd.DataFrame(columns=self.cocktail_columns[:2])
+            else:
+                if hasattr(cocktail_file, "seek"):
+                    cocktail_file.seek(0)  # Buffers may have been read before, e.g. by an earlier analyser
+                self.cocktail = pd.read_csv(cocktail_file, nrows=0 if chunksize or self.cocktail_deferred else None)
+            metrics["rows"] = len(self.cocktail)
+
         # Check the column names in the provided datasets
-        self.validate_cocktail_columns()
-        self.validate_filters_columns()
+        with self.stage("validate"):
+            if not self.cocktail_format:
+                self.validate_cocktail_columns()
+            if not self.filters_prepared:
+                self.validate_filters_columns()
+
+        if pack_reads and not self.cocktail_deferred:
+            self.pack_cocktail()
+
+    def load_cocktail(self):
+        """
+        Load the cocktail table whose loading was deferred until a cache miss.
+        """
+        if not self.cocktail_deferred:
+            return
+        with self.stage("load") as metrics:
+            if hasattr(self.cocktail_file, "seek"):
+                self.cocktail_file.seek(0)
+            self.cocktail = pd.read_csv(self.cocktail_file)
+            metrics["rows"] = len(self.cocktail)
+        self.cocktail_deferred = False
+        if self.pack_reads:
+            self.pack_cocktail()
+
+    def pack_cocktail(self):
+        """
+        Replace the sequence column of the loaded cocktail table by PackedReads.
+        """
+        if self.chunksize is not None:
+            raise ValueError("Only a loaded cocktail table can be packed, not a streamed one.")
+        sequence_col = self.cocktail_columns[0]
+        self.packed_reads = PackedReads.from_series(self.cocktail[sequence_col])
+        self.cocktail = self.cocktail.drop(columns=[sequence_col])
+
+    def stage(self, name):
+        """
+        Return a context manager measuring a stage when instrumentation is enabled, a no-op otherwise.
+        """
+        if self.instrumentation is None:
+            return contextlib.nullcontext({})
+        return self.instrumentation.stage(name)
+
+    @property
+    def incidence(self):
+        """
+        Sparse read x filter incidence matrix of the analysis, None when it was not kept.
+        """
+        if self.accumulator is not None:
+            return self.accumulator.incidence()
+        return self._incidence
+
+    @incidence.setter
+    def incidence(self, incidence):
+        self._incidence = incidence
+
+    def add_reads(self, reads, count_multiple_hits=True, weight_by="rows", **options):
+        """
+        Add a batch of cocktail rows (a DataFrame with the cocktail columns) to the analysis, updating results,
+        multiple_filter_ids and, when kept, the incidence matrix in place. The cost only depends on the size of
+        the batch.
+
+        The analysis continues from process_data or load_state, otherwise the first batch starts it with the given
+        options (see process_data), which later batches keep. Like streaming, an analysis started here does not
+        keep the incidence matrix, which grows with every batch, unless keep_incidence=True is given.
+        """
+        if self.accumulator is None:
+            if self.results:
+                raise ValueError("The current results were not computed incrementally (e.g. loaded from the cache). "
+                                 "Run process_data without a cache before adding reads.")
+            if weight_by not in ("rows", "count"):
+                raise ValueError(f"weight_by should be 'rows' or 'count'. Found {weight_by!r} instead.")
+            self.prepare_filters()
+            options.setdefault("keep_incidence", False)
+            self.accumulator = self.build_accumulator(**options)
+            self.analysis_options = {"count_multiple_hits": count_multiple_hits, "weight_by": weight_by}
+
+        counts = reads[self.cocktail_columns[1]] if self.analysis_options["weight_by"] == "count" else None
+        self.accumulator.update(reads[self.cocktail_columns[0]], counts)
+        self.results.update(self.accumulator.summary(self.analysis_options["count_multiple_hits"]))
+        self.multiple_filter_ids = self.accumulator.multiple_filter_ids
+
+    def save_state(self, filename):
+        """
+        Save the incremental analysis state (options, compiled matchers and counters) to a file, and the
+        multiple_filter_ids spilled to disk to the {filename}.segments directory.
+        """
+        if self.accumulator is None:
+            raise ValueError("There is no analysis state to save, run process_data or add_reads first.")
+        write_state(filename, {"dataset_name": self.dataset_name, "analysis_options": self.analysis_options,
+                               "accumulator": self.accumulator})
+
+    def load_state(self, filename):
+        """
+        Resume an analysis saved with save_state, for the same filters.
+        """
+        state = read_state(filename)
+        self.prepare_filters()
+        if state["accumulator"].filter_ids != self.filters[self.filters_columns[0]].tolist():
+            raise ValueError(f"The analysis state in {filename} was saved for different filters.")
+        self.accumulator = state["accumulator"]
+        self.analysis_options = state["analysis_options"]
+        self.results.update(self.accumulator.summary(self.analysis_options["count_multiple_hits"]))
+        self.multiple_filter_ids = self.accumulator.multiple_filter_ids
 
     def validate_cocktail_columns(self):
         """
@@ -59,83 +263,282 @@ class GeneCocktailAnalyser:
                 f"Empty rows found in Filters DataFrame at indices: {empty_rows}. These rows will be skipped.")
             self.filters.drop(empty_rows, inplace=True)
 
+    def iter_cocktail_chunks(self):
+        """
+        Yield the cocktail data as DataFrames, the whole table or successive chunks in streaming mode.
+        """
+        if self.chunksize is None:
+            yield self.cocktail
+            return
+
+        if self.cocktail_format == "fastq":
+            yield from read_fastq(self.cocktail_file, self.cocktail_columns[:2], self.chunksize, **self.read_options)
+            return
+        if self.cocktail_format == "fasta":
+            yield from read_fasta(self.cocktail_file, self.cocktail_columns[:2], self.chunksize)
+            return
+
+        usecols = [col for col in self.cocktail_columns[:2] if col in self.cocktail.columns]
+        if hasattr(self.cocktail_file, "seek"):
+            self.cocktail_file.seek(0)  # The header (or an earlier run) already consumed the buffer
+        yield from pd.read_csv(self.cocktail_file, usecols=usecols, chunksize=self.chunksize)
+
+    def build_filter_index(self):
+        """
+        Build the filter metadata index shared by the reports and plots.
+        """
+        self.filter_index = FilterIndex(self.filters, self.filters_columns[0], self.filters_columns[1],
+                                        self.filters_columns[2])
+        return self.filter_index
+
+    def progress_tracker(self, progress, cancel, total_rows=None, resumed_rows=0):
+        """
+        Return a callback for the processed batches that checks for cancellation and reports progress.
+        progress is called with a dict of rows_processed, total_rows, reads_per_sec and eta_seconds (total_rows and
+        eta_seconds are None when streaming). Once the cancel event (e.g. a threading.Event) is set,
+        ProcessingCancelled is raised and the results are left untouched. resumed_rows were processed before this
+        run and don't count for the processing rate.
+        """
+        start_time = time.perf_counter()
+
+        def on_batch(accumulator):
+            if cancel is not None and cancel.is_set():
+                raise ProcessingCancelled(f"Processing of {self.dataset_name} was cancelled.")
+            if progress is None:
+                return
+
+            rows_processed = accumulator.rows + accumulator.nan_rows
+            elapsed = time.perf_counter() - start_time
+            reads_per_sec = (rows_processed - resumed_rows) / elapsed if elapsed > 0 else None
+            eta_seconds = None
+            if total_rows is not None and reads_per_sec:
+                eta_seconds = (total_rows - rows_processed) / reads_per_sec
+            progress({"rows_processed": rows_processed, "total_rows": total_rows, "reads_per_sec": reads_per_sec,
+                      "eta_seconds": eta_seconds})
+
+        return on_batch
+
     def save_to_file(self, data, headers, filename):
         """
         Save the data to a file with the given headers and filename.
         """
+        from tabulate import tabulate
         os.makedirs("results", exist_ok=True)  # Ensure the results directory exists
         with open(filename, 'w') as f:
             f.write(tabulate(data, headers=headers))
 
-    def process_data(self, count_multiple_hits=True):
+    def save_figure(self, filename, images=None):
         """
-        Process the data to analyze gene cocktail samples and filter matches.
+        Save the current figure, or images rendered by gca_plots.render_images, as PNG and PDF under the given
+        filename (without extension).
         """
-        # Using column names
-        sequence_col = self.cocktail_columns[0]
+        import matplotlib.pyplot as plt
+        save_images(render_images(plt.gcf()) if images is None else images, filename)
+
+    def prepare_filters(self):
+        """
+        Drop filters without a sequence, sort the filters by ID and build the filter index, once.
+        """
+        if self.filters_prepared:
+            return
         filter_sequence_col = self.filters_columns[2]
         id_col = self.filters_columns[0]
 
-        # Handling NaNs
-        nan_rows = self.cocktail[self.cocktail[sequence_col].isna()].index.tolist()
-        self.results["nan_rows"] = len(nan_rows)
-        self.cocktail.dropna(subset=[sequence_col], inplace=True)
-
         # Handling empty rows in filters dataset and sorting
         self.filters.dropna(subset=[filter_sequence_col], inplace=True)
         self.filters = self.filters.sort_values(by=id_col)
+        self.build_filter_index()
+        self.filters_prepared = True
 
-        # Initialize variables for tracking filter matches
-        matches_count = {}
-        sequences_with_match = set()
-        multiple_hits = {row[id_col]: 0 for _, row in self.filters.iterrows()}
-
-        for _, row in self.filters.iterrows():
-            matches_count[row[id_col]] = 0
-
-        for _, row in self.cocktail.iterrows():
-            sequence = row[sequence_col]
-            filter_occurrences = []
-
-            for _, filter_row in self.filters.iterrows():
-                filter_seq = filter_row[filter_sequence_col]
-                occurrences = sequence.count(filter_seq)
-
-                if occurrences:
-                    filter_occurrences.append((filter_row[id_col], occurrences))
-
-                    # Count the total number of occurrences of this filter sequence in the sample sequence
-                    matches_count[filter_row[id_col]] += occurrences
-                    sequences_with_match.add(row[sequence_col])
-
-                    # Track the occurrences hitting more than once
-                    if occurrences > 1:
-                        # Track the occurrences hitting more than once by filter ID
-                        multiple_hits[filter_row[id_col]] += occurrences
-
-            # Check if there are any filters that appeared more than once, or if there's more than one filter in the sequence
-            total_filters = sum([1 for _, count in filter_occurrences if count > 0])
-            multiple_occurrences = any([count > 1 for _, count in filter_occurrences])
-
-            if total_filters > 1 or multiple_occurrences:
-                self.multiple_filter_ids[self.cocktail.index.get_loc(row.name)] = [filter_id for filter_id, occurrences
-                                                                                   in filter_occurrences if
-                                                                                   occurrences > 0]
-
-        # Store the results of data processing
-        self.results["total_samples"] = len(self.cocktail)
-        self.results["filter_matches"] = matches_count
-        self.results["samples_with_match"] = len(sequences_with_match)
-        self.results["no_filter_match"] = self.results["total_samples"] - len(sequences_with_match)
-        self.results["two_or_more_matches"] = len([count for count in matches_count.values() if count >= 2])
+    def build_accumulator(self, overlapping=False, engine="automaton", keep_incidence=True, max_mismatches=0,
+                          strand="forward"):
+        """
+        Compile the prepared filter set into matchers and return an empty MatchAccumulator using them,
+        see process_data for the options.
+        """
+        if engine not in ("automaton", "kmer"):
+            raise ValueError(f"engine should be 'automaton' or 'kmer'. Found {engine!r} instead.")
+        if strand not in ("forward", "both"):
+            raise ValueError(f"strand should be 'forward' or 'both'. Found {strand!r} instead.")
+
+        # Compile the filter set once, filter positions follow the sorted filters
+        filter_ids = self.filters[self.filters_columns[0]].tolist()
+        filter_sequences = self.filters[self.filters_columns[2]].tolist()
+
+        # For both strands the reverse complements (except palindromes) are compiled as extra patterns
+        strand_positions = None
+        matcher_positions = list(range(len(filter_sequences)))
+        matcher_sequences = list(filter_sequences)
+        if strand == "both":
+            for position, filter_seq in enumerate(filter_sequences):
+                reverse_seq = reverse_complement(filter_seq)
+                if reverse_seq != filter_seq:
+                    matcher_positions.append(position)
+                    matcher_sequences.append(reverse_seq)
+            strand_positions = np.array(matcher_positions, dtype=np.int64)
+
+        if engine == "kmer" and not KmerMatcher.supports(matcher_sequences):
+            warnings.warn(
+                f"The k-mer engine only supports A/C/G/T filters of 1 to {KmerMatcher.max_length} bases. "
+                f"Using the automaton engine instead.")
+            engine = "automaton"
+        matcher_class = KmerMatcher if engine == "kmer" else FilterMatcher
+        matcher = matcher_class(matcher_sequences, overlapping=overlapping)
+
+        approximate_matcher = None
+        if max_mismatches:
+            if isinstance(max_mismatches, dict):
+                filter_mismatches = [max_mismatches.get(filter_ids[position], 0) for position in matcher_positions]
+            else:
+                filter_mismatches = [max_mismatches] * len(matcher_positions)
+            approximate_matcher = ApproximateMatcher(matcher_sequences, filter_mismatches, overlapping=overlapping)
+        options = {"overlapping": overlapping, "keep_incidence": keep_incidence, "max_mismatches": max_mismatches,
+                   "strand": strand}
+        return MatchAccumulator(filter_ids, matcher, keep_incidence, approximate_matcher, strand_positions,
+                                self.multi_hit_bytes, options)
+
+    @instrumented("process_data", rows=lambda self: self.accumulator.rows + self.accumulator.nan_rows
+                  if self.accumulator is not None else 0)
+    def process_data(self, count_multiple_hits=True, overlapping=False, weight_by="rows", workers=None,
+                     engine="automaton", progress=None, cancel=None, keep_incidence=None, max_mismatches=0,
+                     strand="forward", template=None, checkpoint=None, checkpoint_seconds=300, resume=False):
+        """
+        Process the data to analyze gene cocktail samples and filter matches.
 
-        if count_multiple_hits:
-            self.results["multiple_hits"] = multiple_hits
+        - overlapping: count every occurrence, rather than non-overlapping ones like str.count.
+        - weight_by: weigh samples by "rows" or by the read counts of the Count column ("count").
+        - workers: shard the rows across that many processes, see gca_matcher.accumulate_parallel.
+        - engine: "automaton" (gca_matcher.FilterMatcher), or "kmer" (gca_kmer.KmerMatcher).
+        - progress, cancel: progress callback and cancel event, see progress_tracker.
+        - keep_incidence: keep self.incidence (gca_incidence.IncidenceMatrix), the default unless streaming.
+        - max_mismatches: approximate matching, see gca_matcher.ApproximateMatcher and MatchAccumulator.summary.
+        - strand: "forward", or "both" to also match the reverse complements of the filters.
+        - template: an accumulator from build_accumulator whose matchers and matching options are reused.
+        - checkpoint, checkpoint_seconds, resume: save the partial state with write_state every checkpoint_seconds
+          and resume an interrupted run from it, the checkpoint being removed once processing completes.
+        """
+        # Using column names
+        sequence_col = self.cocktail_columns[0]
+        count_col = self.cocktail_columns[1]
+
+        if weight_by not in ("rows", "count"):
+            raise ValueError(f"weight_by should be 'rows' or 'count'. Found {weight_by!r} instead.")
+        if template is not None:
+            # The matching options come from the template, so that cache entries and checkpoints match its results
+            if template.options is None:
+                raise ValueError("template should be an accumulator returned by build_accumulator.")
+            overlapping, keep_incidence, max_mismatches, strand = (
+                template.options[name] for name in ("overlapping", "keep_incidence", "max_mismatches", "strand"))
+        if keep_incidence is None:
+            keep_incidence = self.chunksize is None
+
+        self.prepare_filters()
+
+        # Reuse the results of an earlier run, the engine, workers and chunk size don't change them
+        options = {"count_multiple_hits": count_multiple_hits, "overlapping": overlapping, "weight_by": weight_by,
+                   "read_options": self.read_options, "max_mismatches": max_mismatches,
+                   "strand": strand}
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(file_digest(self.cocktail_file), file_digest(self.filters_file),
+                                       self.cocktail_columns, self.filters_columns, options)
+            cached = self.cache.get(cache_key)
+            if cached is not None and (not keep_incidence or cached["incidence"] is not None):
+                if self.chunksize is None and self.packed_reads is None:
+                    self.cocktail.dropna(subset=[sequence_col], inplace=True)
+                self.accumulator = None
+                self.results.update(cached["results"])
+                self.multiple_filter_ids = cached["multiple_filter_ids"]
+                self.multiple_filter_ids.localize()  # Keep its spilled segments once the entry is evicted
+                self.incidence = cached["incidence"] if keep_incidence else None
+                return
+
+        self.load_cocktail()
+        accumulator = None
+        checkpoint_options = {"cocktail_columns": self.cocktail_columns[:2], "keep_incidence": keep_incidence,
+                              **options}
+        if checkpoint is not None and resume and os.path.exists(checkpoint):
+            state = read_state(checkpoint)
+            if state["accumulator"].filter_ids != self.filters[self.filters_columns[0]].tolist():
+                raise ValueError(f"The checkpoint {checkpoint} was saved for different filters.")
+            if state["options"] != checkpoint_options:
+                raise ValueError(f"The checkpoint {checkpoint} was saved with different analysis options.")
+            accumulator = state["accumulator"]
+        elif template is not None:
+            accumulator = template.spawn()
+        else:
+            accumulator = self.build_accumulator(overlapping, engine, keep_incidence, max_mismatches, strand)
+        resumed_rows = accumulator.rows + accumulator.nan_rows
+
+        chunks = self.iter_cocktail_chunks()
+        if self.chunksize is None:
+            # Shard the in-memory table so that every worker gets several batches and progress is reported (and
+            # checkpoints written) regularly
+            shard_size = len(self.cocktail)
+            if workers and workers > 1:
+                shard_size = -(-shard_size // (workers * 4))
+            if progress is not None or cancel is not None or checkpoint is not None:
+                shard_size = min(shard_size, PROGRESS_BATCH_ROWS)
+            shard_size = max(1, shard_size)
+            if shard_size < len(self.cocktail):
+                chunks = (self.cocktail.iloc[start:start + shard_size]
+                          for start in range(0, len(self.cocktail), shard_size))
+        if resumed_rows:
+            chunks = skip_rows(chunks, resumed_rows)
+        if self.packed_reads is not None:
+            # Packed rows are taken by their position, the packed table keeps its NaN rows and default index
+            batches = ((self.packed_reads.take(chunk.index.to_numpy()), chunk[count_col] if weight_by == "count"
+                        else None) for chunk in chunks)
+        else:
+            batches = ((chunk[sequence_col], chunk[count_col] if weight_by == "count" else None)
+                       for chunk in chunks)
+
+        total_rows = len(self.cocktail) if self.chunksize is None else None
+        on_batch = self.progress_tracker(progress, cancel, total_rows, resumed_rows)
+        if checkpoint is not None:
+            track_batch = on_batch
+            last_checkpoint = time.monotonic()
+
+            def on_batch(accumulator):
+                nonlocal last_checkpoint
+                track_batch(accumulator)
+                if time.monotonic() - last_checkpoint >= checkpoint_seconds:
+                    write_state(checkpoint, {"options": checkpoint_options, "accumulator": accumulator})
+                    last_checkpoint = time.monotonic()
+
+        if workers and workers > 1:
+            accumulate_parallel(accumulator, batches, workers, on_merge=on_batch)
+        else:
+            for sequences, counts in batches:
+                accumulator.update(sequences, counts)
+                on_batch(accumulator)
 
+        # Handling NaNs
+        if self.chunksize is None and self.packed_reads is None:
+            self.cocktail.dropna(subset=[sequence_col], inplace=True)
+
+        # Store the results of data processing, the accumulator stays available for add_reads
+        self.accumulator = accumulator
+        self.analysis_options = {"count_multiple_hits": count_multiple_hits, "weight_by": weight_by}
+        self.results.update(accumulator.summary(count_multiple_hits))
+        self.multiple_filter_ids = accumulator.multiple_filter_ids
+
+        if checkpoint is not None:
+            self.multiple_filter_ids.localize()  # Segments resumed from the checkpoint are removed with it
+            if os.path.exists(checkpoint):
+                os.remove(checkpoint)
+            shutil.rmtree(checkpoint + ".segments", ignore_errors=True)
+        if cache_key is not None:
+            self.cache.put(cache_key, {"results": accumulator.summary(count_multiple_hits),
+                                       "multiple_filter_ids": self.multiple_filter_ids, "incidence": self.incidence})
+
+    @instrumented("display_results")
     def display_results(self):
         """
-        Display the processed results in a formatted table and save to a TXT file.
+        Display the processed results in a formatted table, save to a TXT file and return the report rows.
         """
+        import natsort
+
         headers = ["Section", "Description", "Value", "Fraction"]
         report_data = []
 
@@ -168,11 +571,9 @@ class GeneCocktailAnalyser:
         sorted_filter_matches = natsort.natsorted(self.results["filter_matches"].items())
         total_filter_matches = sum(count for ref, count in sorted_filter_matches)
         filter_match_data = []
+        filter_index = self.filter_index if self.filter_index is not None else self.build_filter_index()
         for ref, count in sorted_filter_matches:
-            filter_row = self.filters[self.filters[self.filters_columns[0]] == ref].iloc[0]
-            description = f"{ref} | {filter_row['Name']}"
-            if "Mutation Codon" in self.filters.columns and pd.notnull(filter_row["Mutation Codon"]):
-                description += f" | {filter_row['Mutation Codon']}"
+            description = filter_index.description(ref)
             filter_match_data.append(("Filter Match", description, count, "{:.2f}%".format(
                 (count / total_samples) * 100) if total_samples != 0 else "0.00%", total_filter_matches))
 
@@ -180,20 +581,12 @@ class GeneCocktailAnalyser:
         report_data.append(("Total Filter Matches", "", total_filter_matches, "", ""))  # Add total sum row
         report_data.append(("", "", "", "", ""))  # Add an empty row as a separator
 
-        # 3. Sequences with Multiple Filter IDs Section
-        sorted_multiple_filter_ids = natsort.natsorted(self.multiple_filter_ids.items())
+        # 3. Sequences with Multiple Filter IDs Section, streamed in index order from the store
         multiple_filter_ids_data = []
 
-        for idx, filter_ids in sorted_multiple_filter_ids:
+        for idx, filter_ids in self.multiple_filter_ids.items():
             if len(filter_ids) > 1:
-                description_list = []
-                for filter_id in filter_ids:
-                    filter_row = self.filters[self.filters[self.filters_columns[0]] == filter_id].iloc[0]
-                    description_part = f"{filter_id} | {filter_row['Name']}"
-                    if "Mutation Codon" in self.filters.columns and pd.notnull(filter_row["Mutation Codon"]):
-                        description_part += f" | {filter_row['Mutation Codon']}"
-                    description_list.append(description_part)
-                description = ', '.join(description_list)
+                description = ', '.join(filter_index.description(filter_id) for filter_id in filter_ids)
 
                 multiple_filter_ids_data.append(
                     ("Multiple Filter Matches per Sequence", description, f"index: {idx}", "-", ""))
@@ -213,151 +606,121 @@ class GeneCocktailAnalyser:
         consolidated_filename = f"results/{self.dataset_name}_consolidated_report.txt"
         self.save_to_file(report_data, headers, consolidated_filename)
 
-    def plot_visualizations(self):
-        self.plot_summary_data()
-        self.plot_frequency_of_matches()
-        self.plot_heatmap()
+        return report_data
 
-    def plot_summary_data(self):
-        total_samples = self.results['total_samples']
-        samples_with_match = total_samples - self.results['no_filter_match']
-        samples_with_multiple_matches = self.results['two_or_more_matches']
+    @instrumented("write_report")
+    def write_report(self, report_format="csv", directory="results", summary=True):
+        """
+        Stream the report to machine-readable files under directory ("csv", "jsonl" or "columnar", see
+        gca_report.write_report), with an optional human-readable summary. Unlike display_results, memory does not
+        grow with the number of reads with multiple filter matches. Return the written filenames.
+        """
+        filter_index = self.filter_index if self.filter_index is not None else self.build_filter_index()
+        return write_report(os.path.join(directory, f"{self.dataset_name}_report"), self.results, filter_index,
+                            self.multiple_filter_ids, report_format, summary)
 
-        # Data for donut chart
-        sizes = [samples_with_match, self.results['no_filter_match'], samples_with_multiple_matches]
-        labels = ['With Matches', 'Without Matches', 'With Multiple Matches']
-        colors = sns.color_palette("viridis", len(sizes))
+    def filter_combinations(self, min_support=2, min_size=2, max_size=None):
+        """
+        Return the combinations of filters hit together by at least min_support samples, as a DataFrame of
+        Filters, Size and Support sorted by size and decreasing support.
 
-        # Plotting
-        plt.figure(figsize=(8, 8))
-        wedges, texts, autotexts = plt.pie(sizes, labels=None, colors=colors, startangle=90,
-                                           wedgeprops={'linewidth': 7, 'edgecolor': 'white'},
-                                           autopct=lambda p: f'{p:.1f}%')  # Display percentages
+        Only samples hitting several filters can hold a combination, so the per-filter bitsets cover the samples
+        of multiple_filter_ids.
+        """
+        bitsets = FilterBitsets.from_store(self.multiple_filter_ids)
+        return combinations_frame(bitsets.frequent_combinations(min_support, min_size, max_size))
 
-        for text, label, color in zip(texts, labels, colors):
-            text.set_text(label)  # Set label text
-            text.set_color(color)  # Set label text color to match wedge colors
-            text.set_fontsize(15)  # Adjust font size of labels
+    def plot_visualizations(self):
+        self.plot_summary_data()
+        self.plot_frequency_of_matches()
+        self.plot_heatmap()
 
-        for autotext, color in zip(autotexts, colors):
-            autotext.set_color(color)  # Set percentage text color to match wedge colors
-            autotext.set_fontsize(12)  # Adjust font size of percentages
+    def mutation_codons(self):
+        """
+        Return {filter ID: mutation codon} for the matched filters, None without a "Mutation Codon" column.
+        """
+        filter_index = self.filter_index if self.filter_index is not None else self.build_filter_index()
+        if filter_index.codons is None:
+            return None
+        return {ref: filter_index.codon(ref) for ref in self.results["filter_matches"]}
 
-        plt.gca().add_artist(
-            plt.Circle((0, 0), 0.70, color='white'))  # Draw a white circle at the center to create the donut hole
+    @instrumented("plot_summary_data")
+    def plot_summary_data(self):
+        import matplotlib.pyplot as plt
 
-        plt.title(f'{self.dataset_name} Summary Chart')
-        plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-        plt.tight_layout()
+        draw_summary_chart(self.results, self.dataset_name)
 
         # Save donut chart
         donut_chart_filename = f"results/plots/{self.dataset_name}_summary_chart"
-        plt.savefig(donut_chart_filename + ".pdf", dpi=300)
-        plt.savefig(donut_chart_filename + ".png", dpi=300)
+        self.save_figure(donut_chart_filename)
         plt.show()
 
+    @instrumented("plot_frequency_of_matches")
     def plot_frequency_of_matches(self, include_codons=False):
-        # Getting filter matches and sorting them by count
-        sorted_filter_matches = natsort.natsorted(self.results["filter_matches"].items(), key=lambda x: x[1],
-                                                  reverse=True)
-        labels = [str(ref) for ref, _ in sorted_filter_matches]
-        values = [count for _, count in sorted_filter_matches]
-
-        # Check if the "Mutation Codon" column exists
-        id_col = self.filters_columns[self.filters_columns.index("ID")]
-        mutation_codon_col = "Mutation Codon"
-
-        # Create sorted filter dataframe
-        sorted_filters_df = self.filters.set_index(id_col).loc[labels].reset_index()
-
-        has_mutation_codon = mutation_codon_col in self.filters.columns
-        mutation_codons = sorted_filters_df[mutation_codon_col] if has_mutation_codon else []
-
-        # Plotting
-        plt.figure(figsize=(10, 7))  # Adjust the figure size as needed
-        bars = plt.bar(labels, values, color=sns.color_palette("viridis", len(labels)), alpha=0.7)
-
-        if has_mutation_codon:
-            # Calculate dynamic y-axis limit
-            max_value = max(values)
-            y_limit = max_value + max_value * 0.1  # Increase the y-axis limit by 10% of the maximum value
-
-            # Annotate each bar with mutation codons
-            for bar, codon in zip(bars, mutation_codons):
-                annotation_padding = max_value * 0.02  # 2% of max value
-                x_pos = bar.get_x() + bar.get_width() / 2
-                y_pos = bar.get_height() + annotation_padding
-                ha = 'center'
-                va = 'bottom'
-                plt.text(x_pos, y_pos, codon, ha=ha, va=va, fontsize=15)
-
-            plt.ylim(0, y_limit)
-
-        plt.xlabel('Filters', fontsize=17, labelpad=10)
-        plt.ylabel('Number of Matches', fontsize=17)
-        plt.title(f'Frequency of Filter Matches for {self.dataset_name}', fontsize=20)
-        plt.xticks(rotation=45, ha='right', fontsize=12)  # Rotate x-axis labels at 45 degrees
-        plt.yticks(fontsize=12)
-        # Set the y-axis tick parameters to point inwards and remove x-axis ticks
-        plt.gca().tick_params(axis='y', direction='in', which='both', length=4)
-        plt.gca().tick_params(axis='x', which='both', bottom=False)  # This line removes the x-axis ticks
-
-        plt.tight_layout()
-        plt.grid(axis='y', linestyle='--', alpha=0.6)
+        import matplotlib.pyplot as plt
+
+        draw_frequency_histogram(self.results["filter_matches"], self.dataset_name, self.mutation_codons())
 
         # Save histogram plot
         histogram_filename = f"results/plots/{self.dataset_name}_histogram"
-        plt.savefig(histogram_filename + ".png", dpi=300)
-        plt.savefig(histogram_filename + ".pdf", dpi=300)
+        self.save_figure(histogram_filename)
 
         plt.grid(False)  # Disable grids
         plt.show()
 
-    def plot_heatmap(self):
-        """
-        Generate a heatmap for samples with multiple filter matches.
-        """
-        # Extract multiple filter IDs from the instance variable
-        multiple_filter_ids = self.multiple_filter_ids
-
-        # Create a set to store all unique filters
-        all_filters = set()
-        for filters in multiple_filter_ids.values():
-            all_filters.update(filters)
-        all_filters = sorted(list(all_filters))
-
-        # Create an empty matrix to store co-occurrences
-        matrix = np.zeros((len(all_filters), len(all_filters)))
-
-        # Compute co-occurrences
-        for filters in multiple_filter_ids.values():
-            n = len(filters)
-            for i in range(n):
-                for j in range(i + 1, n):  # This will ensure that we only get the unique pairs
-                    idx_i = all_filters.index(filters[i])
-                    idx_j = all_filters.index(filters[j])
-                    matrix[idx_i][idx_j] += 1
-                    matrix[idx_j][idx_i] += 1  # the matrix is symmetric
-
-        # Step 1: Create a mask for the entire matrix
-        mask = np.zeros_like(matrix, dtype=bool)
-
-        # Step 2: Set the upper triangle (including the diagonal) in the mask to True
-        mask[np.triu_indices_from(mask, k=1)] = True  # k=1 excludes the diagonal from the mask
-
-        # Plotting the heatmap with the adjusted mask
-        plt.figure(figsize=(10, 8))
-        heatmap = sns.heatmap(matrix, annot=True, cmap="viridis", xticklabels=all_filters,
-                              yticklabels=all_filters, mask=mask,  # Use the adjusted mask
-                              cbar_kws={'label': 'Co-occurrence count'})
-        cbar = heatmap.collections[0].colorbar  # Get the colorbar instance
-        cbar.set_label('Co-occurrence count', fontsize=15)  # Set colorbar label font size
-        heatmap.set_title("Filter Co-occurrences in Samples with Multiple Matches", fontsize=15)
-        heatmap.set_xlabel("Filters", fontsize=15)
-        heatmap.set_ylabel("Filters", fontsize=15)
+    @instrumented("render_plots")
+    def render_plots(self, workers=None, max_filters=HEATMAP_MAX_FILTERS, heatmap_mode="top", cluster=False,
+                     annotate=None):
+        """
+        Headless rendering: draw and render the summary chart, histogram and heatmap concurrently in worker processes
+        with the non-interactive Agg backend, without showing them, and save them with save_figure. Return the
+        filenames (without extension).
+
+        Heatmaps of more than max_filters filters are reduced to the top co-occurring filters or downsampled
+        (heatmap_mode="downsample"), optionally clustered, see gca_plots.reduce_heatmap. Cells are annotated only
+        for small heatmaps unless annotate is given.
+        """
+        matrix, labels = reduce_heatmap(*self.cooccurrence_matrix(), max_filters=max_filters, mode=heatmap_mode,
+                                        cluster=cluster)
+        summary = {key: self.results[key] for key in ("total_samples", "no_filter_match", "two_or_more_matches")}
+        jobs = [
+            (draw_summary_chart, (summary, self.dataset_name)),
+            (draw_frequency_histogram, (self.results["filter_matches"], self.dataset_name, self.mutation_codons())),
+            (draw_heatmap, (matrix, labels, annotate)),
+        ]
+        filenames = [f"results/plots/{self.dataset_name}_{name}" for name in ("summary_chart", "histogram", "heatmap")]
+        for filename, images in zip(filenames, render_figures(jobs, workers)):
+            self.save_figure(filename, images)
+        return filenames
+
+    def cooccurrence_matrix(self):
+        """
+        Return the co-occurrence counts of filters in samples with multiple matches (zero diagonal), together with
+        the sorted filter IDs labelling its rows and columns.
+        """
+        store = self.multiple_filter_ids
+
+        # Aᵀ·A of the binary incidence matrix of the samples with multiple matches, accumulated block by block
+        # and restricted to the filters they hit
+        hit_positions = np.flatnonzero(store.filter_counts())
+        order = sorted(hit_positions.tolist(), key=lambda position: store.filter_ids[position])
+        matrix = store.cooccurrence()[np.ix_(order, order)]
+        np.fill_diagonal(matrix, 0)
+        return matrix, [store.filter_ids[position] for position in order]
+
+    @instrumented("plot_heatmap")
+    def plot_heatmap(self, max_filters=HEATMAP_MAX_FILTERS, heatmap_mode="top", cluster=False, annotate=None):
+        """
+        Generate a heatmap for samples with multiple filter matches, reduced for large filter sets as in
+        render_plots.
+        """
+        import matplotlib.pyplot as plt
+
+        matrix, labels = reduce_heatmap(*self.cooccurrence_matrix(), max_filters=max_filters, mode=heatmap_mode,
+                                        cluster=cluster)
+        draw_heatmap(matrix, labels, annotate)
 
         # Save heatmap plot
         heatmap_filename = f"results/plots/{self.dataset_name}_heatmap"
-        plt.savefig(heatmap_filename + ".png", dpi=300)
-        plt.savefig(heatmap_filename + ".pdf", dpi=300)
+        self.save_figure(heatmap_filename)
         plt.show()
\ No newline at end of file
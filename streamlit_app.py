@@ -1,13 +1,38 @@
 import streamlit as st
-import pandas as pd
-import os
-import tempfile
+import threading
+import time
 import warnings
-from gca_streamlit import GeneCocktailAnalyser
+from gca_cache import file_digest
+from gca_streamlit import GeneCocktailAnalyser, ProcessingCancelled
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
 
+
+def start_analysis(cocktail, filters, upload_key):
+    """
+    Run the analysis of the uploads in a background thread and return the job state shared with it.
+    """
+    job = {"upload_key": upload_key, "status": "running", "progress": None, "error": None,
+           "analyser": None, "cancel": threading.Event()}
+
+    def run():
+        try:
+            analyser = GeneCocktailAnalyser(cocktail, filters)
+            analyser.process_data(progress=lambda progress: job.update(progress=progress), cancel=job["cancel"])
+            job["analyser"] = analyser
+            job["status"] = "done"
+        except ProcessingCancelled:
+            job["status"] = "cancelled"
+        except Exception as error:
+            job["error"] = error
+            job["status"] = "failed"
+
+    job["thread"] = threading.Thread(target=run, daemon=True)
+    job["thread"].start()
+    return job
+
+
 # Streamlit app title
 st.title("Gene Cocktail Analyser")
 
@@ -16,28 +41,51 @@ uploaded_filters = st.file_uploader("Upload Filters File (CSV)", type=["csv"])
 
 if uploaded_cocktail and uploaded_filters:
 
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        # Set the current working directory to the temp directory
-        os.chdir(tmpdirname)
+    # Every widget interaction reruns the script, only analyse again when the uploaded content changes
+    upload_key = (file_digest(uploaded_cocktail), file_digest(uploaded_filters))
+    job = st.session_state.get("job")
+    if job is None or job["upload_key"] != upload_key:
+        if job is not None:
+            job["cancel"].set()
+        uploaded_cocktail.seek(0)
+        uploaded_filters.seek(0)
+        job = start_analysis(uploaded_cocktail, uploaded_filters, upload_key)
+        st.session_state["job"] = job
 
-        cocktail_df = pd.read_csv(uploaded_cocktail)
-        filters_df = pd.read_csv(uploaded_filters)
+    if job["status"] == "running":
+        if st.button("Cancel Analysis"):
+            job["cancel"].set()
+            job["thread"].join()
+            st.experimental_rerun()
 
-        # Write cocktail_df to a temporary CSV
-        temp_cocktail = tempfile.NamedTemporaryFile(delete=False, suffix='.csv')
-        cocktail_df.to_csv(temp_cocktail.name, index=False)
+        # Poll the background thread, a button click interrupts this loop with a rerun
+        progress_bar = st.progress(0)
+        progress_text = st.empty()
+        while job["thread"].is_alive():
+            progress = job["progress"]
+            if progress is not None:
+                progress_bar.progress(min(progress["rows_processed"] / max(progress["total_rows"], 1), 1.0))
+                eta = "-" if progress["eta_seconds"] is None else f"{progress['eta_seconds']:.0f}s"
+                progress_text.write(f"Processed {progress['rows_processed']} of {progress['total_rows']} rows "
+                                    f"({progress['reads_per_sec'] or 0:.0f} reads/sec, ETA {eta})")
+            time.sleep(0.5)
+        st.experimental_rerun()
 
-        # Write filters_df to a temporary CSV
-        temp_filters = tempfile.NamedTemporaryFile(delete=False, suffix='.csv')
-        filters_df.to_csv(temp_filters.name, index=False)
+    elif job["status"] in ("cancelled", "failed"):
+        if job["status"] == "cancelled":
+            st.write("Analysis cancelled.")
+        else:
+            st.error(f"Analysis failed: {job['error']}")
+        if st.button("Restart Analysis"):
+            del st.session_state["job"]
+            st.experimental_rerun()
 
-        analyser = GeneCocktailAnalyser(temp_cocktail.name, temp_filters.name)
-        analyser.process_data()
+    else:
+        analyser = job["analyser"]
         st.write("Uploaded files processed!")
 
         if st.button("Display Results"):
             st.write("Displaying results...")
-            # Update display_results to return results
             results = analyser.display_results()
             for row in results:
                 st.write(" | ".join(str(item) for item in row))
@@ -48,7 +96,3 @@ if uploaded_cocktail and uploaded_filters:
             # Update plot_visualizations to return the created figure
             fig = analyser.plot_visualizations()
             st.pyplot(fig)
-
-        # Cleanup temporary files
-        os.remove(temp_cocktail.name)
-        os.remove(temp_filters.name)
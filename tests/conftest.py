@@ -0,0 +1,71 @@
+import contextlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generators import generate_cocktail, generate_filters  # noqa: E402
+import gene_cocktail_analyser  # noqa: E402
+
+
+@pytest.fixture
+def filters():
+    return generate_filters(n_filters=20, filter_length=6, seed=1)
+
+
+@pytest.fixture
+def cocktail(filters):
+    return generate_cocktail(filters, n_reads=3000, read_length=40, duplication_rate=0.5, multi_hit_density=0.2,
+                             seed=1)
+
+
+@pytest.fixture
+def dataset(tmp_path, filters, cocktail):
+    """
+    Write the synthetic cocktail and filters as CSV files, return their paths.
+    """
+    cocktail_file = tmp_path / "synthetic_cocktail.csv"
+    filters_file = tmp_path / "synthetic_filters.csv"
+    cocktail.to_csv(cocktail_file, index=False)
+    filters.to_csv(filters_file, index=False)
+    return str(cocktail_file), str(filters_file)
+
+
+@pytest.fixture
+def expected(dataset):
+    """
+    Results and multiple filter matches of an uninterrupted in-memory run weighted by the Count column.
+    """
+    analyser = gene_cocktail_analyser.GeneCocktailAnalyser(*dataset)
+    analyser.process_data(weight_by="count")
+    return analyser.results, dict(analyser.multiple_filter_ids.items())
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def interrupt_after_checkpoints(monkeypatch):
+    """
+    Return a context manager in which process_data is interrupted (as by a crash) when it writes its next
+    checkpoint after the given number of them. It yields the row offsets of the checkpoints written.
+    """
+    @contextlib.contextmanager
+    def interrupt(checkpoints):
+        write_state = gene_cocktail_analyser.write_state
+        written = []
+
+        def interrupting_write_state(filename, state):
+            if len(written) == checkpoints:
+                raise Interrupted()
+            written.append(state["accumulator"].rows + state["accumulator"].nan_rows)
+            write_state(filename, state)
+
+        with monkeypatch.context() as patch, pytest.raises(Interrupted):
+            patch.setattr(gene_cocktail_analyser, "write_state", interrupting_write_state)
+            yield written
+
+    return interrupt
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.generators import random_sequences
+from gca_matcher import ApproximateMatcher
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+def hamming(window, filter_seq):
+    return sum(base != filter_base for base, filter_base in zip(window, filter_seq))
+
+
+def brute_force_scan(sequence, filter_sequences, max_mismatches, overlapping):
+    """
+    Count the windows at 1 to max_mismatches substitutions of every filter (capped below its length), greedily
+    from the left unless overlapping.
+    """
+    found = []
+    for position, (filter_seq, mismatches) in enumerate(zip(filter_sequences, max_mismatches)):
+        mismatches = min(mismatches, len(filter_seq) - 1)
+        count, next_start = 0, 0
+        for start in range(len(sequence) - len(filter_seq) + 1):
+            distance = hamming(sequence[start:start + len(filter_seq)], filter_seq)
+            if 1 <= distance <= mismatches and (overlapping or start >= next_start):
+                count += 1
+                next_start = start + len(filter_seq)
+        if count:
+            found.append((position, count))
+    return found
+
+
+@pytest.fixture
+def sequences():
+    rng = np.random.default_rng(3)
+    sequences = random_sequences(rng, 300, 30)
+    # Ambiguous bases, repeats with overlapping approximate windows and sequences shorter than the filters
+    return sequences + ["ACGNACGTNNACGA", "AAAAAAAAAAAA", "ACAACAACA", "AC", ""]
+
+
+@pytest.mark.parametrize("overlapping", [False, True])
+def test_scan_matches_brute_force(sequences, overlapping):
+    filter_sequences = ["ACGT", "AAAA", "ACA", "GATTACA", "TT", "ACGT"]
+    max_mismatches = [1, 2, 1, 2, 5, 0]  # 5 is capped at 1 for TT, 0 disables the last filter
+    matcher = ApproximateMatcher(filter_sequences, max_mismatches, overlapping=overlapping)
+    assert matcher.max_mismatches == [1, 2, 1, 2, 1, 0]
+    for sequence in sequences:
+        assert matcher.scan(sequence) == brute_force_scan(sequence, filter_sequences, max_mismatches, overlapping)
+
+
+def test_process_data_counts_approximate_matches(tmp_path, sequences):
+    filters = pd.DataFrame({"ID": ["F1", "F2", "F3"], "Name": ["a", "b", "c"],
+                            "Filter Sequence": ["ACGT", "GATTACA", "AAAA"], "Mutation Codon": "AAA"})
+    cocktail = pd.DataFrame({"Sequence": sequences, "Count": 1, "Amino Acid": "X"})
+    cocktail_file = str(tmp_path / "synthetic_cocktail.csv")
+    cocktail.to_csv(cocktail_file, index=False)
+    max_mismatches = {"F1": 1, "F2": 2}
+
+    analyser = GeneCocktailAnalyser(cocktail_file, filters)
+    analyser.process_data(max_mismatches=max_mismatches)
+
+    filter_sequences = filters["Filter Sequence"].tolist()
+    limits = [max_mismatches.get(filter_id, 0) for filter_id in filters["ID"]]
+    approximate_matches = dict.fromkeys(filters["ID"], 0)
+    exact_matches = dict.fromkeys(filters["ID"], 0)
+    rescued = 0
+    for sequence in cocktail["Sequence"].fillna(""):
+        found = brute_force_scan(sequence, filter_sequences, limits, overlapping=False)
+        for position, count in found:
+            approximate_matches[filters["ID"][position]] += count
+        exact = [sequence.count(filter_seq) for filter_seq in filter_sequences]
+        for filter_id, count in zip(filters["ID"], exact):
+            exact_matches[filter_id] += count
+        rescued += bool(found) and not any(exact)
+
+    assert analyser.results["filter_matches"] == exact_matches
+    assert analyser.results["approximate_filter_matches"] == approximate_matches
+    assert analyser.results["samples_with_approximate_match"] == rescued
+    assert rescued
@@ -0,0 +1,32 @@
+import warnings
+
+import pytest
+
+from benchmarks.generators import generate_cocktail
+from gca_batch import run_batch
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_matches_individual_runs(tmp_path, monkeypatch, filters, workers):
+    monkeypatch.chdir(tmp_path)  # Reports are written under results/
+    filters = filters.assign(Extra="x")  # Unexpected column, warned about once for the whole batch
+    filters_file = str(tmp_path / "filters.csv")
+    filters.to_csv(filters_file, index=False)
+    cocktail_files = []
+    for seed in range(3):
+        cocktail_file = str(tmp_path / f"sample{seed}_cocktail.csv")
+        generate_cocktail(filters, n_reads=1000, read_length=40, seed=seed).to_csv(cocktail_file, index=False)
+        cocktail_files.append(cocktail_file)
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        matrix = run_batch(cocktail_files, filters_file, workers=workers)
+    assert len([warning for warning in caught if "Filters DataFrame columns" in str(warning.message)]) == 1
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for cocktail_file in cocktail_files:
+            analyser = GeneCocktailAnalyser(cocktail_file, filters_file)
+            analyser.process_data()
+            assert matrix[analyser.dataset_name].to_dict() == analyser.results["filter_matches"]
@@ -0,0 +1,62 @@
+from gca_cache import ResultCache
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+def test_cache_round_trip(tmp_path, monkeypatch, dataset, expected):
+    cache = ResultCache(str(tmp_path / "cache"))
+    analyser = GeneCocktailAnalyser(*dataset, chunksize=700, cache=cache)
+    analyser.process_data(weight_by="count")
+    assert len(cache.entries()) == 1
+
+    # A cache hit does not compile the filters again
+    def no_compilation(*args, **kwargs):
+        raise AssertionError("The filters were compiled despite the cached results.")
+
+    monkeypatch.setattr(GeneCocktailAnalyser, "build_accumulator", no_compilation)
+    cached = GeneCocktailAnalyser(*dataset, chunksize=700, cache=cache)
+    cached.process_data(weight_by="count", workers=2, engine="kmer")
+    assert cached.results == expected[0]
+    assert dict(cached.multiple_filter_ids.items()) == expected[1]
+
+    # Other options are another entry
+    monkeypatch.undo()
+    GeneCocktailAnalyser(*dataset, chunksize=700, cache=cache).process_data()
+    assert len(cache.entries()) == 2
+
+
+def test_cache_hit_does_not_load_the_table(tmp_path, dataset, cocktail, expected):
+    cache = ResultCache(str(tmp_path / "cache"))
+    analyser = GeneCocktailAnalyser(*dataset, cache=cache)
+    assert len(analyser.cocktail) == 0
+    analyser.process_data(weight_by="count")
+    assert len(analyser.cocktail) == len(cocktail)
+
+    cached = GeneCocktailAnalyser(*dataset, cache=cache, pack_reads=True)
+    cached.process_data(weight_by="count")
+    assert len(cached.cocktail) == 0 and cached.packed_reads is None
+    assert cached.results == expected[0]
+    assert dict(cached.multiple_filter_ids.items()) == expected[1]
+
+    # A miss loads (and packs) the table
+    cached.process_data()
+    assert len(cached.packed_reads) == len(cocktail)
+    assert cached.results["filter_matches"] != expected[0]["filter_matches"]
+
+
+def test_template_options_key_the_cache(tmp_path, dataset):
+    cache = ResultCache(str(tmp_path / "cache"))
+    reference = GeneCocktailAnalyser(*dataset)
+    reference.process_data(max_mismatches=1, keep_incidence=False)
+    template = reference.build_accumulator(keep_incidence=False, max_mismatches=1)
+
+    # The entry written by a run from the template is keyed by the template's options, not process_data's defaults
+    GeneCocktailAnalyser(*dataset, cache=cache).process_data(template=template)
+    plain = GeneCocktailAnalyser(*dataset, cache=cache)
+    plain.process_data(keep_incidence=False)
+    assert len(cache.entries()) == 2
+    assert "approximate_filter_matches" in reference.results and "approximate_filter_matches" not in plain.results
+
+    cached = GeneCocktailAnalyser(*dataset, cache=cache)
+    cached.process_data(max_mismatches=1, keep_incidence=False)
+    assert len(cache.entries()) == 2
+    assert cached.results == reference.results
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+import gene_cocktail_analyser
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+def test_resume_interrupted_in_memory_run(tmp_path, monkeypatch, dataset, expected, interrupt_after_checkpoints):
+    monkeypatch.setattr(gene_cocktail_analyser, "PROGRESS_BATCH_ROWS", 500)
+    checkpoint = str(tmp_path / "run.checkpoint")
+
+    # Without progress or cancel, the loaded table is still processed (and checkpointed) in bounded batches
+    with interrupt_after_checkpoints(2) as written:
+        GeneCocktailAnalyser(*dataset).process_data(weight_by="count", checkpoint=checkpoint, checkpoint_seconds=0)
+    assert written == [500, 1000]
+    assert os.path.exists(checkpoint)
+
+    resumed = GeneCocktailAnalyser(*dataset)
+    resumed.process_data(weight_by="count", checkpoint=checkpoint, checkpoint_seconds=0, resume=True)
+    assert resumed.accumulator.rows + resumed.accumulator.nan_rows == len(resumed.cocktail)
+    assert resumed.results == expected[0]
+    assert dict(resumed.multiple_filter_ids.items()) == expected[1]
+    assert not os.path.exists(checkpoint)
+
+
+def test_resume_interrupted_chunked_run(tmp_path, dataset, expected, interrupt_after_checkpoints):
+    checkpoint = str(tmp_path / "run.checkpoint")
+    with interrupt_after_checkpoints(1):
+        GeneCocktailAnalyser(*dataset, chunksize=700).process_data(weight_by="count", checkpoint=checkpoint,
+                                                                   checkpoint_seconds=0)
+
+    # Resuming with other options is refused, the same options continue after the checkpointed rows
+    with pytest.raises(ValueError):
+        GeneCocktailAnalyser(*dataset, chunksize=700).process_data(checkpoint=checkpoint, resume=True)
+    analyser = GeneCocktailAnalyser(*dataset, chunksize=700)
+    analyser.process_data(weight_by="count", checkpoint=checkpoint, resume=True)
+    assert analyser.results == expected[0]
+    assert dict(analyser.multiple_filter_ids.items()) == expected[1]
+    assert not os.path.exists(checkpoint)
@@ -0,0 +1,53 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from gca_combinations import combinations_frame, FilterBitsets
+
+
+@pytest.fixture
+def read_filters():
+    rng = np.random.default_rng(5)
+    filter_ids = [f"F{index}" for index in range(9)]
+    # Skewed hit probabilities so that combinations of every size are frequent at some supports
+    probabilities = np.linspace(0.05, 0.6, len(filter_ids))
+    return [[filter_id for filter_id, hit in zip(filter_ids, rng.random(len(filter_ids)) < probabilities) if hit]
+            for _ in range(300)]
+
+
+def brute_force(read_filters, min_support, min_size, max_size):
+    filter_ids = sorted({filter_id for filters in read_filters for filter_id in filters})
+    read_sets = [set(filters) for filters in read_filters]
+    found = {}
+    for size in range(min_size, (max_size or len(filter_ids)) + 1):
+        for combination in combinations(filter_ids, size):
+            support = sum(read_set.issuperset(combination) for read_set in read_sets)
+            if support >= min_support:
+                found[combination] = support
+    return found
+
+
+@pytest.mark.parametrize("min_support, min_size, max_size", [
+    (2, 2, None),
+    (1, 1, None),
+    (10, 1, 3),
+    (20, 2, 2),
+    (5, 3, None),
+    (300, 1, None),
+])
+def test_frequent_combinations_match_brute_force(read_filters, min_support, min_size, max_size):
+    found = FilterBitsets.from_read_filters(read_filters).frequent_combinations(min_support, min_size, max_size)
+    expected = brute_force(read_filters, min_support, min_size, max_size)
+    assert len(found) == len(dict(found))
+    assert dict(found) == expected
+    if min_support <= 10:
+        assert max(len(combination) for combination in expected) >= 3
+
+
+def test_combinations_frame_order(read_filters):
+    frame = combinations_frame(FilterBitsets.from_read_filters(read_filters).frequent_combinations(5, 1))
+    assert list(frame.columns) == ["Filters", "Size", "Support"]
+    keys = list(zip(frame["Size"], -frame["Support"]))
+    assert keys == sorted(keys)
+    assert (frame["Size"] == frame["Filters"].map(len)).all()
@@ -0,0 +1,15 @@
+import numpy as np
+
+from gca_incidence import IncidenceMatrix
+
+
+def test_cooccurrence_matches_dense_product():
+    rng = np.random.default_rng(11)
+    dense = rng.integers(0, 3, size=(200, 7)) * (rng.random((200, 7)) < 0.4)
+    rows, positions = np.nonzero(dense)
+    matrix = IncidenceMatrix.from_hits(len(dense), dense.shape[1], rows, positions, dense[rows, positions])
+    binary = (dense > 0).astype(np.int64)
+    np.testing.assert_array_equal(matrix.cooccurrence(), binary.T @ binary)
+
+    stacked = IncidenceMatrix.vstack([matrix.take_rows(np.arange(0, 120)), matrix.take_rows(np.arange(120, 200))], 7)
+    np.testing.assert_array_equal(stacked.cooccurrence(), binary.T @ binary)
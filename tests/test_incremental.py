@@ -0,0 +1,29 @@
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+def test_add_reads_matches_full_run(tmp_path, dataset, cocktail):
+    cocktail_file, filters_file = dataset
+    expected = GeneCocktailAnalyser(cocktail_file, filters_file)
+    expected.process_data()
+
+    analyser = GeneCocktailAnalyser(cocktail_file, filters_file, chunksize=1000)
+    analyser.add_reads(cocktail.iloc[:1000])
+    assert analyser.incidence is None
+
+    # The saved state holds no per-read incidence and continues like an uninterrupted analysis
+    state = str(tmp_path / "analysis.state")
+    analyser.save_state(state)
+    resumed = GeneCocktailAnalyser(cocktail_file, filters_file, chunksize=1000)
+    resumed.load_state(state)
+    for start in range(1000, len(cocktail), 1000):
+        resumed.add_reads(cocktail.iloc[start:start + 1000])
+    assert resumed.results == expected.results
+    assert dict(resumed.multiple_filter_ids.items()) == dict(expected.multiple_filter_ids.items())
+
+
+def test_add_reads_keeps_incidence_on_request(dataset, cocktail):
+    cocktail_file, filters_file = dataset
+    analyser = GeneCocktailAnalyser(cocktail_file, filters_file, chunksize=1000)
+    analyser.add_reads(cocktail.iloc[:1000], keep_incidence=True)
+    analyser.add_reads(cocktail.iloc[1000:])
+    assert analyser.incidence.shape[0] == len(cocktail)
@@ -0,0 +1,99 @@
+import tracemalloc
+
+import pytest
+
+from gca_instrumentation import Instrumentation, instrumented
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+METRICS = {"rows", "wall_seconds", "cpu_seconds", "peak_rss_bytes", "peak_traced_bytes"}
+
+
+def test_stage_metrics_and_hooks():
+    calls = []
+    instrumentation = Instrumentation(hooks=[lambda stage, metrics: calls.append((stage, metrics))])
+    with instrumentation.stage("first") as metrics:
+        metrics["rows"] = 3
+    with instrumentation.stage("second"):
+        pass
+
+    assert list(instrumentation.stages) == ["first", "second"]
+    assert calls == list(instrumentation.stages.items())
+    first, second = instrumentation.stages["first"], instrumentation.stages["second"]
+    assert set(first) == set(second) == METRICS
+    assert first["rows"] == 3 and second["rows"] is None
+    assert first["wall_seconds"] >= 0 and first["cpu_seconds"] >= 0
+    assert first["peak_traced_bytes"] is None
+    # The peak RSS is the process peak so far, it never decreases from one stage to the next
+    if first["peak_rss_bytes"] is not None:
+        assert second["peak_rss_bytes"] >= first["peak_rss_bytes"] > 0
+
+
+def test_failed_stage_is_not_recorded():
+    calls = []
+    instrumentation = Instrumentation(hooks=[lambda stage, metrics: calls.append(stage)])
+    with pytest.raises(RuntimeError):
+        with instrumentation.stage("failing"):
+            raise RuntimeError()
+    assert instrumentation.stages == {} and calls == []
+
+
+def test_trace_memory_measures_each_stage():
+    assert not tracemalloc.is_tracing()
+    instrumentation = Instrumentation(trace_memory=True)
+    with instrumentation.stage("allocating"):
+        data = bytearray(8 << 20)
+        del data
+    with instrumentation.stage("small"):
+        pass
+    assert not tracemalloc.is_tracing()
+    assert instrumentation.stages["allocating"]["peak_traced_bytes"] >= 8 << 20
+    assert instrumentation.stages["small"]["peak_traced_bytes"] < 8 << 20
+
+
+def test_instrumented_method():
+    class Analyser:
+        def __init__(self, instrumentation):
+            self.instrumentation = instrumentation
+            self.rows = 0
+
+        @instrumented("run", rows=lambda self: self.rows)
+        def run(self, rows):
+            """
+            Run.
+            """
+            self.rows = rows
+            return rows * 2
+
+    assert Analyser.run.__doc__.strip() == "Run."
+    assert Analyser(None).run(5) == 10
+    instrumentation = Instrumentation()
+    assert Analyser(instrumentation).run(5) == 10
+    assert instrumentation.stages["run"]["rows"] == 5
+
+
+def test_analyser_stages(tmp_path, monkeypatch, dataset, cocktail):
+    monkeypatch.chdir(tmp_path)
+    calls = []
+    instrumentation = Instrumentation(hooks=[lambda stage, metrics: calls.append(stage)])
+    analyser = GeneCocktailAnalyser(*dataset, instrumentation=instrumentation)
+    analyser.process_data()
+    analyser.write_report()
+
+    assert calls == ["load", "validate", "process_data", "write_report"]
+    assert analyser.metrics is instrumentation.stages
+    assert list(analyser.metrics) == calls
+    assert analyser.metrics["load"]["rows"] == len(cocktail)
+    assert analyser.metrics["process_data"]["rows"] == len(cocktail)
+    assert all(set(metrics) == METRICS for metrics in analyser.metrics.values())
+
+    enabled = GeneCocktailAnalyser(*dataset, instrumentation=True)
+    enabled.process_data()
+    assert list(enabled.metrics) == ["load", "validate", "process_data"]
+
+
+def test_disabled_analyser_has_no_metrics(tmp_path, monkeypatch, dataset):
+    monkeypatch.chdir(tmp_path)
+    analyser = GeneCocktailAnalyser(*dataset)
+    analyser.process_data()
+    analyser.write_report()
+    assert analyser.instrumentation is None and analyser.metrics == {}
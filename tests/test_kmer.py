@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from gca_kmer import KmerMatcher, PackedSequences
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+@pytest.mark.parametrize("overlapping", [False, True])
+def test_scan_batch_in_slices(filters, cocktail, overlapping):
+    sequences = cocktail["Sequence"].tolist() + ["", "ACGTN" * 3]
+    matcher = KmerMatcher(filters["Filter Sequence"], overlapping)
+    expected = matcher.scan_batch(sequences)
+    for max_slice_bases in (1, 137):
+        matcher.max_slice_bases = max_slice_bases
+        for column, expected_column in zip(matcher.scan_batch(sequences), expected):
+            np.testing.assert_array_equal(column, expected_column)
+
+
+def test_packed_sequences_take_and_slice():
+    sequences = ["ACGTN", "", "GGGTTTACNNA", "acgtXACGT", "T"] * 3
+    packed = PackedSequences.from_sequences(sequences)
+    decoded = ["".join(base if base in "ACGT" else "N" for base in sequence) for sequence in sequences]
+    assert list(packed) == decoded
+    assert list(packed.take([9, 0, 2, 2])) == [decoded[9], decoded[0], decoded[2], decoded[2]]
+    assert list(packed.slice(3, 11)) == decoded[3:11]
+
+
+@pytest.mark.parametrize("pack_reads, workers", [(False, None), (True, None), (True, 2)])
+def test_kmer_engine_matches_automaton(dataset, expected, pack_reads, workers):
+    analyser = GeneCocktailAnalyser(*dataset, pack_reads=pack_reads)
+    analyser.process_data(weight_by="count", engine="kmer", workers=workers)
+    assert analyser.results == expected[0]
+    assert dict(analyser.multiple_filter_ids.items()) == expected[1]
+
+
+def test_packed_reads_keep_missing_rows(tmp_path, filters, cocktail):
+    cocktail = cocktail.copy()
+    cocktail.loc[[3, 10], "Sequence"] = None
+    cocktail_file = str(tmp_path / "synthetic_cocktail.csv")
+    cocktail.to_csv(cocktail_file, index=False)
+    expected = GeneCocktailAnalyser(cocktail_file, filters)
+    expected.process_data()
+
+    analyser = GeneCocktailAnalyser(cocktail_file, filters, pack_reads=True)
+    assert analyser.packed_reads.isna().sum() == 2
+    assert "Sequence" not in analyser.cocktail.columns
+    analyser.process_data(engine="kmer")
+    assert analyser.results == expected.results
+    assert dict(analyser.multiple_filter_ids.items()) == dict(expected.multiple_filter_ids.items())
@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from gca_kmer import KmerMatcher
+from gca_matcher import FilterMatcher
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+@pytest.fixture
+def overlapping_filters(filters):
+    """
+    The synthetic filters plus filters whose occurrences overlap, one of them twice under another ID.
+    """
+    extra = pd.DataFrame({"ID": ["F91", "F92", "F93", "F94"], "Name": ["aa", "aaaa", "acac", "aaaa_copy"],
+                          "Filter Sequence": ["AA", "AAAA", "ACAC", "AAAA"], "Mutation Codon": "AAA"})
+    return pd.concat([filters, extra], ignore_index=True)
+
+
+@pytest.fixture
+def sequences(cocktail):
+    return cocktail["Sequence"].tolist() + ["AAAAAAAAA", "ACACACACA", "", "NNAAAANN"]
+
+
+def str_count_scan(sequence, filter_sequences):
+    return [(position, sequence.count(filter_seq)) for position, filter_seq in enumerate(filter_sequences)
+            if sequence.count(filter_seq)]
+
+
+@pytest.mark.parametrize("matcher_class", [FilterMatcher, KmerMatcher])
+def test_matcher_counts_like_str_count(matcher_class, overlapping_filters, sequences):
+    filter_sequences = overlapping_filters["Filter Sequence"].tolist()
+    matcher = matcher_class(filter_sequences)
+    for sequence in sequences:
+        assert matcher.scan(sequence) == str_count_scan(sequence, filter_sequences)
+
+    sequence_indices, filter_positions, occurrences = matcher.scan_batch(sequences)
+    expected = [(index, position, count) for index, sequence in enumerate(sequences)
+                for position, count in str_count_scan(sequence, filter_sequences)]
+    assert list(zip(sequence_indices.tolist(), filter_positions.tolist(), occurrences.tolist())) == expected
+
+
+@pytest.mark.parametrize("matcher_class", [FilterMatcher, KmerMatcher])
+def test_overlapping_counts_every_occurrence(matcher_class, overlapping_filters, sequences):
+    filter_sequences = overlapping_filters["Filter Sequence"].tolist()
+    matcher = matcher_class(filter_sequences, overlapping=True)
+    for sequence in sequences:
+        expected = []
+        for position, filter_seq in enumerate(filter_sequences):
+            count = sum(sequence.startswith(filter_seq, start) for start in range(len(sequence)))
+            if count:
+                expected.append((position, count))
+        assert matcher.scan(sequence) == expected
+
+
+def test_process_data_matches_str_count_loop(tmp_path, overlapping_filters, cocktail):
+    # The per-row, per-filter str.count loop that process_data replaces
+    filters = overlapping_filters.sort_values(by="ID")
+    matches_count = dict.fromkeys(filters["ID"], 0)
+    multiple_hits = dict.fromkeys(filters["ID"], 0)
+    multiple_filter_ids = {}
+    for row, sequence in enumerate(cocktail["Sequence"]):
+        filter_occurrences = [(filter_id, sequence.count(filter_seq))
+                              for filter_id, filter_seq in zip(filters["ID"], filters["Filter Sequence"])
+                              if sequence.count(filter_seq)]
+        for filter_id, occurrences in filter_occurrences:
+            matches_count[filter_id] += occurrences
+            if occurrences > 1:
+                multiple_hits[filter_id] += occurrences
+        if len(filter_occurrences) > 1 or any(occurrences > 1 for _, occurrences in filter_occurrences):
+            multiple_filter_ids[row] = [filter_id for filter_id, _ in filter_occurrences]
+
+    cocktail_file = str(tmp_path / "synthetic_cocktail.csv")
+    cocktail.to_csv(cocktail_file, index=False)
+    for engine in ("automaton", "kmer"):
+        analyser = GeneCocktailAnalyser(cocktail_file, overlapping_filters)
+        analyser.process_data(engine=engine)
+        assert analyser.results["total_samples"] == len(cocktail)
+        assert analyser.results["filter_matches"] == matches_count
+        assert analyser.results["multiple_hits"] == multiple_hits
+        assert dict(analyser.multiple_filter_ids.items()) == multiple_filter_ids
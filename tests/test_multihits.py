@@ -0,0 +1,72 @@
+import gc
+import os
+import pickle
+
+import numpy as np
+
+from gca_cache import ResultCache
+from gca_combinations import FilterBitsets
+from gca_multihits import MultiHitStore, pickled_segments
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+def filled_store(max_bytes):
+    store = MultiHitStore(["F1", "F2", "F3", "F4"], max_bytes)
+    for start in range(0, 40, 4):
+        store.extend(np.arange(start, start + 4) * 3, [0, 2, 5, 7, 9], [0, 1, 0, 2, 3, 1, 3, 2, 3])
+    return store
+
+
+def test_pickle_references_spilled_segments(tmp_path):
+    store = filled_store(max_bytes=200)
+    expected = dict(store.items())
+    assert store.segments
+
+    with pickled_segments(str(tmp_path / "segments")):
+        data = pickle.dumps(store)
+    assert len(data) < sum(os.path.getsize(f"{prefix}_positions.npy") for _, _, prefix in store.segments)
+
+    # The pickle outlives the temporary spill directory of the store
+    del store
+    gc.collect()
+    loaded = pickle.loads(data)
+    assert dict(loaded.items()) == expected
+    loaded.localize()
+    for name in os.listdir(tmp_path / "segments"):
+        os.remove(tmp_path / "segments" / name)
+    assert dict(loaded.items()) == expected
+
+
+def test_bitsets_from_store():
+    store = filled_store(max_bytes=200)
+    expected = FilterBitsets.from_read_filters(store.values())
+    bitsets = FilterBitsets.from_store(store)
+    assert bitsets.filter_ids == expected.filter_ids
+    np.testing.assert_array_equal(bitsets.bits, expected.bits)
+
+
+def test_spilled_state_and_cache_round_trip(tmp_path, dataset):
+    cocktail_file, filters_file = dataset
+    expected = GeneCocktailAnalyser(cocktail_file, filters_file)
+    expected.process_data()
+    expected_hits = dict(expected.multiple_filter_ids.items())
+
+    cache = ResultCache(str(tmp_path / "cache"))
+    analyser = GeneCocktailAnalyser(cocktail_file, filters_file, chunksize=500, cache=cache, multi_hit_bytes=1000)
+    analyser.process_data()
+    assert analyser.multiple_filter_ids.segments
+    state = str(tmp_path / "analysis.state")
+    analyser.save_state(state)
+    del analyser
+    gc.collect()
+
+    loaded = GeneCocktailAnalyser(cocktail_file, filters_file, chunksize=500)
+    loaded.load_state(state)
+    assert dict(loaded.multiple_filter_ids.items()) == expected_hits
+
+    cached = GeneCocktailAnalyser(cocktail_file, filters_file, chunksize=500, cache=cache)
+    cached.process_data()
+    cache.invalidate()
+    assert not os.listdir(cache.directory)
+    assert cached.results == expected.results
+    assert dict(cached.multiple_filter_ids.items()) == expected_hits
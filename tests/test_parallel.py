@@ -0,0 +1,11 @@
+import pytest
+
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+@pytest.mark.parametrize("chunksize", [None, 700])
+def test_parallel_run_matches_sequential_run(dataset, expected, chunksize):
+    analyser = GeneCocktailAnalyser(*dataset, chunksize=chunksize)
+    analyser.process_data(weight_by="count", workers=2)
+    assert analyser.results == expected[0]
+    assert dict(analyser.multiple_filter_ids.items()) == expected[1]
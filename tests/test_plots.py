@@ -0,0 +1,82 @@
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+from gca_plots import draw_heatmap, draw_summary_chart, reduce_heatmap, render_figures
+from gca_streamlit import GeneCocktailAnalyser as StreamlitAnalyser
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+@pytest.fixture
+def cooccurrences():
+    rng = np.random.default_rng(3)
+    matrix = rng.integers(0, 20, size=(23, 23))
+    matrix = np.tril(matrix, -1) + np.tril(matrix, -1).T
+    return matrix, [f"F{index}" for index in range(len(matrix))]
+
+
+def test_top_keeps_most_cooccurring_filters(cooccurrences):
+    matrix, labels = cooccurrences
+    reduced, reduced_labels = reduce_heatmap(matrix, labels, max_filters=5)
+    keep = sorted(np.argsort(-matrix.sum(axis=1), kind="stable")[:5].tolist())
+    assert reduced_labels == [labels[position] for position in keep]
+    np.testing.assert_array_equal(reduced, matrix[np.ix_(keep, keep)])
+
+
+@pytest.mark.parametrize("cluster", [False, True])
+def test_downsample_counts_every_pair_once(cooccurrences, cluster):
+    matrix, labels = cooccurrences
+    reduced, reduced_labels = reduce_heatmap(matrix, labels, max_filters=5, mode="downsample", cluster=cluster)
+    assert len(reduced_labels) == 5
+    np.testing.assert_array_equal(reduced, reduced.T)
+    # The lower triangle (diagonal included) drawn by draw_heatmap holds every pair of filters exactly once
+    assert np.tril(reduced).sum() == np.triu(matrix, 1).sum()
+
+    if not cluster:
+        groups = np.arange(len(labels)) * 5 // len(labels)
+        expected = np.zeros((5, 5), dtype=matrix.dtype)
+        for first, second in itertools.combinations(range(len(labels)), 2):
+            low, high = sorted((groups[first], groups[second]))
+            expected[high, low] += matrix[first, second]
+        np.testing.assert_array_equal(np.tril(reduced), expected)
+        assert reduced_labels[0] == "F0 (+4)"
+
+
+def test_small_heatmaps_are_not_reduced(cooccurrences):
+    matrix, labels = cooccurrences
+    for mode in ("top", "downsample"):
+        reduced, reduced_labels = reduce_heatmap(matrix, labels, max_filters=50, mode=mode)
+        np.testing.assert_array_equal(reduced, matrix)
+        assert reduced_labels == labels
+    with pytest.raises(ValueError):
+        reduce_heatmap(matrix, labels, mode="sample")
+
+
+def test_render_figures_in_workers(cooccurrences):
+    matrix, labels = cooccurrences
+    jobs = [(draw_heatmap, reduce_heatmap(matrix, labels, max_filters=5) + (True,)),
+            (draw_summary_chart, ({"total_samples": 10, "no_filter_match": 4, "two_or_more_matches": 2}, "test"))]
+    rendered = render_figures(jobs, workers=2)
+    assert len(rendered) == 2
+    for images in rendered:
+        assert images["png"].startswith(b"\x89PNG") and images["pdf"].startswith(b"%PDF")
+    assert render_figures([]) == []
+
+
+@pytest.mark.parametrize("analyser_class", [GeneCocktailAnalyser, StreamlitAnalyser])
+def test_render_plots_saves_through_save_figure(dataset, tmp_path, monkeypatch, analyser_class):
+    monkeypatch.chdir(tmp_path)
+    analyser = analyser_class(*dataset)
+    analyser.process_data()
+    filenames = analyser.render_plots(workers=2, max_filters=5, heatmap_mode="downsample")
+
+    assert [os.path.basename(filename) for filename in filenames] == [
+        f"{analyser.dataset_name}_{name}" for name in ("summary_chart", "histogram", "heatmap")]
+    written = sorted(os.listdir("results/plots")) if os.path.isdir("results/plots") else []
+    if analyser_class is StreamlitAnalyser:
+        assert written == []
+    else:
+        assert written == sorted(f"{os.path.basename(filename)}.{extension}"
+                                 for filename in filenames for extension in ("pdf", "png"))
@@ -0,0 +1,106 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import gca_readers
+from benchmarks.generators import random_sequences
+from gca_readers import read_fasta, read_fastq
+
+
+@pytest.fixture
+def reads():
+    rng = np.random.default_rng(7)
+    sequences = [sequence[:length] for sequence, length in
+                 zip(random_sequences(rng, 200, 60), rng.integers(1, 61, size=200).tolist())]
+    qualities = ["".join(chr(33 + score) for score in rng.integers(2, 41, size=len(sequence)).tolist())
+                 for sequence in sequences]
+    return sequences, qualities
+
+
+def fastq(sequences, qualities, newline="\n"):
+    return "".join(f"@read{index}{newline}{sequence}{newline}+{newline}{quality}{newline}"
+                   for index, (sequence, quality) in enumerate(zip(sequences, qualities))).encode("ascii")
+
+
+def fasta(sequences, width=None, newline="\n"):
+    records = []
+    for index, sequence in enumerate(sequences):
+        lines = [sequence[start:start + width] for start in range(0, len(sequence), width)] if width else [sequence]
+        records.append(f">read{index} description{newline}" + "".join(line + newline for line in lines))
+    return "".join(records).encode("ascii")
+
+
+def read_all(chunks):
+    frame = pd.concat(list(chunks), ignore_index=True)
+    assert (frame["Count"] == 1).all()
+    return frame["Sequence"].tolist()
+
+
+def write(path, content, compress=False):
+    with (gzip.open if compress else open)(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("compress", [False, True])
+def test_read_fastq_across_blocks(tmp_path, monkeypatch, reads, newline, compress):
+    monkeypatch.setattr(gca_readers, "BLOCK_SIZE", 97)  # Records are split across blocks
+    sequences, qualities = reads
+    path = write(tmp_path / ("reads.fastq.gz" if compress else "reads.fastq"), fastq(sequences, qualities, newline),
+                 compress)
+    assert read_all(read_fastq(path, chunksize=33)) == sequences
+
+
+@pytest.mark.parametrize("width", [None, 7])
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("compress", [False, True])
+def test_read_fasta_across_blocks(tmp_path, monkeypatch, reads, width, newline, compress):
+    monkeypatch.setattr(gca_readers, "BLOCK_SIZE", 97)
+    sequences, _ = reads
+    path = write(tmp_path / ("reads.fa.gz" if compress else "reads.fa"), fasta(sequences, width, newline), compress)
+    assert read_all(read_fasta(path, chunksize=33)) == sequences
+
+
+def test_truncated_fastq_record(tmp_path, reads):
+    sequences, qualities = reads
+    content = fastq(sequences, qualities)
+    path = write(tmp_path / "truncated.fastq", content[:content.rindex(b"+")])
+    with pytest.raises(ValueError, match="Truncated FASTQ record"):
+        list(read_fastq(path))
+
+
+def filtered_reference(sequences, qualities, trim_quality=None, min_mean_quality=None, min_length=None):
+    """
+    Apply the quality trimming and filtering of read_fastq one record at a time.
+    """
+    kept = []
+    for sequence, quality in zip(sequences, qualities):
+        scores = [ord(char) - 33 for char in quality]
+        length = len(sequence)
+        if trim_quality is not None:
+            while length and scores[length - 1] < trim_quality:
+                length -= 1
+        if not length or (min_length is not None and length < min_length):
+            continue
+        if min_mean_quality is not None and sum(scores[:length]) < min_mean_quality * length:
+            continue
+        kept.append(sequence[:length])
+    return kept
+
+
+@pytest.mark.parametrize("options", [
+    {"trim_quality": 20},
+    {"min_mean_quality": 22},
+    {"min_length": 30},
+    {"trim_quality": 15, "min_mean_quality": 25, "min_length": 10},
+])
+def test_quality_filtering_matches_per_record_reference(tmp_path, monkeypatch, reads, options):
+    monkeypatch.setattr(gca_readers, "BLOCK_SIZE", 97)
+    sequences, qualities = reads
+    path = write(tmp_path / "reads.fastq", fastq(sequences, qualities))
+    expected = filtered_reference(sequences, qualities, **options)
+    assert 0 < len(expected) < len(sequences)
+    assert read_all(read_fastq(path, chunksize=33, **options)) == expected
@@ -0,0 +1,107 @@
+import csv
+import json
+import os
+
+import numpy as np
+import pytest
+
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+@pytest.fixture
+def analysis(tmp_path, dataset):
+    # Small chunks and a small multi-hit budget, so that the store has spilled segments and several blocks
+    analyser = GeneCocktailAnalyser(*dataset, chunksize=500, multi_hit_bytes=1000)
+    analyser.process_data(weight_by="count")
+    assert analyser.multiple_filter_ids.segments
+    multi_hits = {index: filter_ids for index, filter_ids in analyser.multiple_filter_ids.items()
+                  if len(set(filter_ids)) > 1}
+    assert multi_hits
+    return analyser, multi_hits
+
+
+def read_csv(filename):
+    with open(filename, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def optional_float(value):
+    return float(value) if value != "" else None
+
+
+def check_summary(records, results):
+    values = {record["metric"]: (int(record["value"]), optional_float(record["fraction"])) for record in records}
+    assert values.pop("total_filter_matches") == (sum(results["filter_matches"].values()), None)
+    assert values.pop("total_samples") == (results["total_samples"], None)
+    assert values.pop("nan_rows") == (results["nan_rows"], None)
+    assert values == {metric: (results[metric], pytest.approx(results[metric] / results["total_samples"]))
+                      for metric in ("samples_with_match", "no_filter_match", "two_or_more_matches")}
+
+
+def check_filters(records, results, filter_index):
+    assert [record["filter_id"] for record in records] == [str(filter_id) for filter_id in results["filter_matches"]]
+    for record, (filter_id, count) in zip(records, results["filter_matches"].items()):
+        assert record["name"] == str(filter_index.name(filter_id))
+        assert int(record["matches"]) == count
+        assert float(record["fraction"]) == pytest.approx(count / results["total_samples"])
+
+
+def test_csv_report(tmp_path, analysis):
+    analyser, multi_hits = analysis
+    filenames = analyser.write_report("csv", directory=str(tmp_path))
+    prefix = os.path.join(str(tmp_path), f"{analyser.dataset_name}_report")
+    assert filenames == [f"{prefix}_summary.csv", f"{prefix}_filters.csv", f"{prefix}_multiple_filter_ids.csv",
+                         f"{prefix}_summary.txt"]
+
+    check_summary(read_csv(filenames[0]), analyser.results)
+    check_filters(read_csv(filenames[1]), analyser.results, analyser.filter_index)
+    assert {int(record["index"]): record["filter_ids"].split(";") for record in read_csv(filenames[2])} == {
+        index: [str(filter_id) for filter_id in filter_ids] for index, filter_ids in multi_hits.items()}
+    with open(filenames[3]) as f:
+        assert f"Reads with multiple filter matches: {len(multi_hits)}" in f.read()
+
+
+def test_jsonl_report(tmp_path, analysis):
+    analyser, multi_hits = analysis
+    filenames = analyser.write_report("jsonl", directory=str(tmp_path), summary=False)
+    assert [os.path.basename(filename) for filename in filenames] == [f"{analyser.dataset_name}_report.jsonl"]
+
+    with open(filenames[0]) as f:
+        sections = {}
+        for line in f:
+            record = json.loads(line)
+            sections.setdefault(record.pop("section"), []).append(record)
+    assert set(sections) == {"summary", "filter", "multiple_filter_matches"}
+    check_summary([{key: "" if value is None else str(value) for key, value in record.items()}
+                   for record in sections["summary"]], analyser.results)
+    check_filters([{key: str(value) for key, value in record.items()} for record in sections["filter"]],
+                  analyser.results, analyser.filter_index)
+    indices = [record["index"] for record in sections["multiple_filter_matches"]]
+    assert indices == sorted(multi_hits)
+    assert {record["index"]: record["filter_ids"] for record in sections["multiple_filter_matches"]} == multi_hits
+
+
+def test_columnar_report(tmp_path, analysis):
+    analyser, multi_hits = analysis
+    filenames = analyser.write_report("columnar", directory=str(tmp_path), summary=False)
+    prefix = os.path.join(str(tmp_path), f"{analyser.dataset_name}_report")
+    assert filenames == [f"{prefix}_{name}" for name in ("summary.csv", "filters.csv", "rows.npy", "indptr.npy",
+                                                         "positions.npy")]
+
+    check_summary(read_csv(filenames[0]), analyser.results)
+    filters = read_csv(filenames[1])
+    check_filters(filters, analyser.results, analyser.filter_index)
+    store = analyser.multiple_filter_ids
+    for record in filters:
+        assert str(store.filter_ids[int(record["position"])]) == record["filter_id"]
+
+    rows, indptr, positions = (np.load(filename) for filename in filenames[2:])
+    assert indptr[0] == 0 and indptr[-1] == len(positions) and len(indptr) == len(rows) + 1
+    np.testing.assert_array_equal(rows, sorted(multi_hits))
+    assert {row: [store.filter_ids[position] for position in positions[start:stop].tolist()]
+            for row, start, stop in zip(rows.tolist(), indptr[:-1].tolist(), indptr[1:].tolist())} == multi_hits
+
+
+def test_unknown_report_format(tmp_path, analysis):
+    with pytest.raises(ValueError):
+        analysis[0].write_report("parquet", directory=str(tmp_path))
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from benchmarks.generators import generate_cocktail
+from gca_matcher import reverse_complement
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+@pytest.fixture
+def stranded_dataset(tmp_path, filters):
+    """
+    Filters with two palindromes, and reads carrying filters on either strand.
+    """
+    palindromes = pd.DataFrame({"ID": ["P1", "P2"], "Name": ["p1", "p2"], "Filter Sequence": ["ACGT", "GAATTC"],
+                                "Mutation Codon": "AAA"})
+    filters = pd.concat([filters, palindromes], ignore_index=True)
+    inserted = pd.concat([filters, filters.assign(**{"Filter Sequence": filters["Filter Sequence"].map(
+        reverse_complement)})], ignore_index=True)
+    cocktail = generate_cocktail(inserted, n_reads=2000, read_length=40, multi_hit_density=0.3, seed=5)
+    cocktail_file = str(tmp_path / "stranded_cocktail.csv")
+    cocktail.to_csv(cocktail_file, index=False)
+    return cocktail_file, filters, cocktail
+
+
+@pytest.mark.parametrize("engine, workers", [("automaton", None), ("kmer", None), ("automaton", 2), ("kmer", 2)])
+def test_both_strands_match_str_count_loop(stranded_dataset, engine, workers):
+    cocktail_file, filters, cocktail = stranded_dataset
+    by_strand = {filter_id: {"+": 0, "-": 0} for filter_id in filters["ID"]}
+    for sequence in cocktail["Sequence"]:
+        for filter_id, filter_seq in zip(filters["ID"], filters["Filter Sequence"]):
+            reverse_seq = reverse_complement(filter_seq)
+            by_strand[filter_id]["+"] += sequence.count(filter_seq)
+            if reverse_seq != filter_seq:  # Palindromes are only counted on the forward strand
+                by_strand[filter_id]["-"] += sequence.count(reverse_seq)
+
+    analyser = GeneCocktailAnalyser(cocktail_file, filters)
+    analyser.process_data(engine=engine, workers=workers, strand="both")
+    assert analyser.results["filter_matches_by_strand"] == by_strand
+    assert analyser.results["filter_matches"] == {filter_id: counts["+"] + counts["-"]
+                                                  for filter_id, counts in by_strand.items()}
+    assert by_strand["P1"]["+"] and all(counts["-"] for filter_id, counts in by_strand.items()
+                                        if filter_id.startswith("F"))
@@ -0,0 +1,32 @@
+import io
+
+import pytest
+
+from gca_cache import ResultCache
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+@pytest.mark.parametrize("encode", [False, True], ids=["StringIO", "BytesIO"])
+def test_stream_buffer_in_chunks(tmp_path, filters, cocktail, encode):
+    content = cocktail.to_csv(index=False)
+    buffer = io.BytesIO(content.encode("utf-8")) if encode else io.StringIO(content)
+    expected = GeneCocktailAnalyser(io.StringIO(content), filters)
+    expected.process_data()
+
+    # The header read, an earlier run and the cache digest all leave the buffer consumed
+    cache = ResultCache(str(tmp_path / "cache"))
+    for _ in range(2):
+        analyser = GeneCocktailAnalyser(buffer, filters, chunksize=700, cache=cache)
+        analyser.process_data()
+        assert analyser.results == expected.results
+        analyser = GeneCocktailAnalyser(buffer, filters, chunksize=700)
+        analyser.process_data()
+        assert analyser.results == expected.results
+
+
+@pytest.mark.parametrize("chunksize", [97, 700, 5000])
+def test_chunked_run_matches_in_memory_run(dataset, expected, chunksize):
+    analyser = GeneCocktailAnalyser(*dataset, chunksize=chunksize)
+    analyser.process_data(weight_by="count")
+    assert analyser.results == expected[0]
+    assert dict(analyser.multiple_filter_ids.items()) == expected[1]
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pandas as pd
+
+from gca_readers import TailReader
+from gca_watch import watch
+from gene_cocktail_analyser import GeneCocktailAnalyser
+
+
+def csv_pieces(cocktail, n_pieces=7):
+    """
+    Split the CSV content of the cocktail into pieces cut in the middle of lines, the header coming first.
+    """
+    content = cocktail.to_csv(index=False).encode("utf-8")
+    header_end = content.index(b"\n") + 1
+    body = content[header_end:]
+    cuts = [header_end] + [header_end + len(body) * index // n_pieces + 3 for index in range(1, n_pieces)]
+    return [content[start:stop] for start, stop in zip([0] + cuts, cuts + [len(content)])]
+
+
+def fastq_content(sequences):
+    return b"".join(b"@read%d\n%s\n+\n%s\n" % (index, sequence.encode(), b"I" * len(sequence))
+                    for index, sequence in enumerate(sequences))
+
+
+def follow(tail, path, pieces):
+    chunks = []
+    for piece in pieces:
+        with open(path, "ab") as f:
+            f.write(piece)
+        chunk = tail.read_new()
+        if chunk is not None:
+            chunks.append(chunk)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def test_tail_csv_with_partial_lines(tmp_path, cocktail):
+    path = str(tmp_path / "growing_cocktail.csv")
+    open(path, "wb").close()
+    read = follow(TailReader(path), path, csv_pieces(cocktail))
+    assert read["Sequence"].tolist() == cocktail["Sequence"].tolist()
+    assert read["Count"].tolist() == cocktail["Count"].tolist()
+
+
+def test_tail_fastq_with_partial_records(tmp_path, cocktail):
+    path = str(tmp_path / "growing_reads.fastq")
+    open(path, "wb").close()
+    content = fastq_content(cocktail["Sequence"])
+    pieces = [content[start:start + 1001] for start in range(0, len(content), 1001)]
+    read = follow(TailReader(path, "fastq"), path, pieces)
+    assert read["Sequence"].tolist() == cocktail["Sequence"].tolist()
+
+
+def append_later(path, pieces):
+    def write():
+        for piece in pieces:
+            time.sleep(0.02)
+            with open(path, "ab") as f:
+                f.write(piece)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    return writer
+
+
+def test_watch_matches_full_run(tmp_path, dataset, cocktail):
+    cocktail_file, filters_file = dataset
+    expected = GeneCocktailAnalyser(cocktail_file, filters_file)
+    expected.process_data()
+
+    path = str(tmp_path / "growing_cocktail.csv")
+    pieces = csv_pieces(cocktail)
+    with open(path, "wb") as f:
+        f.write(pieces[0])
+    writer = append_later(path, pieces[1:])
+    analyser = GeneCocktailAnalyser(path, filters_file, chunksize=1000)
+    reports = []
+    watch(analyser, report_reads=1000, poll_seconds=0.01, idle_timeout=0.5, report=lambda: reports.append(1))
+    writer.join()
+    assert analyser.results == expected.results
+    assert dict(analyser.multiple_filter_ids.items()) == dict(expected.multiple_filter_ids.items())
+    assert reports
+
+
+def test_resume_watch_from_saved_state(tmp_path, dataset, cocktail):
+    cocktail_file, filters_file = dataset
+    expected = GeneCocktailAnalyser(cocktail_file, filters_file)
+    expected.process_data()
+
+    path = str(tmp_path / "growing_cocktail.csv")
+    pieces = csv_pieces(cocktail)
+    with open(path, "wb") as f:
+        f.write(b"".join(pieces[:4]))
+    analyser = GeneCocktailAnalyser(path, filters_file, chunksize=1000)
+    tail = watch(analyser, poll_seconds=0.01, idle_timeout=0.1, report=lambda: None)
+    state = str(tmp_path / "analysis.state")
+    analyser.save_state(state)
+
+    with open(path, "ab") as f:
+        f.write(b"".join(pieces[4:]))
+    resumed = GeneCocktailAnalyser(path, filters_file, chunksize=1000)
+    resumed.load_state(state)
+    watch(resumed, poll_seconds=0.01, idle_timeout=0.1, report=lambda: None, tail=tail)
+    assert resumed.results == expected.results
+    assert dict(resumed.multiple_filter_ids.items()) == dict(expected.multiple_filter_ids.items())